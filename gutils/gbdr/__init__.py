@@ -1,10 +1,22 @@
 #!/usr/bin/env python
 
+import numpy as np
+
 from gutils.gbdr.methods import (
     create_glider_BD_ASCII_reader,
     find_glider_BD_headers,
-    map_line
+    GliderRow,
+    ddmm_to_decimal,
+    header_index,
+    map_line,
+    map_row,
+    map_columns,
+    merge_columns,
+    read_values,
+    rows_to_columns,
+    select_headers
 )
+from gutils.gbdr.decoder import decode_glider_BD_files
 
 
 class GliderBDReader(object):
@@ -15,34 +27,154 @@ class GliderBDReader(object):
     data at a time.
 
     Arguments:
-    path - Directory where binary data is stored.
-    fileType - Types of files to process
-    fileNames - An optional set specifying exactly which files to process.
+    filePaths - List of glider binary data files to process.
+    native - Decode the files in Python instead of running dbd2asc.
+        Default: False
+    stream - Read dbd2asc output from its pipe as rows are consumed instead
+        of buffering all of it first.  Default: False
+    sensors - An optional whitelist of sensor names or <sensor>-<units> keys.
+        Only these (and the time sensors) are converted and returned.
+        Default: all sensors
+    cache - An optional gutils.gbdr.cache.SegmentCache.  Files already in the
+        cache are loaded from it without decoding them again.
+        Default: None
+    cache_path - Directory of the sensor list cache (.cac) files, or its
+        gutils.gbdr.sensor_lists.SensorListCache.  Use one per deployment.
+        Default: the system temporary directory
     """
 
-    def __init__(self, filePaths):
-        self.reader = (
-            create_glider_BD_ASCII_reader(filePaths)
-        )
+    def __init__(self, filePaths, native=False, stream=False, sensors=None,
+                 cache=None, cache_path=None):
+        self.native = native
+        self.selected = None
+        self.data = None
+        # Decimal degrees of the GPS coordinates of data by row
+        self.point_data = None
+        if cache is not None:
+            self.reader = None
+            self.headers, self.data = cache.decode_files(
+                filePaths, native=native, sensors=sensors,
+                cache_path=cache_path
+            )
+            self.row_index = 0
+        elif native:
+            self.reader = None
+            self.headers, self.data = decode_glider_BD_files(
+                filePaths, cache_path, sensors
+            )
+            self.row_index = 0
+        else:
+            self.reader = create_glider_BD_ASCII_reader(
+                filePaths, stream, cache_path
+            )
 
-        self.headers = find_glider_BD_headers(self.reader)
+            self.headers = find_glider_BD_headers(self.reader)
+            self.select_sensors(sensors)
+        self.index = header_index(self.headers, self.selected)
         self.finished = False
 
+    def select_sensors(self, sensors):
+        """Restricts the sensors returned to a whitelist
+
+        Natively decoded and cached readers drop the other columns and
+        headers.  dbd2asc readers keep all headers but skip converting the
+        other columns.
+
+        Arguments:
+        sensors - Iterable of sensor names or <sensor>-<units> keys.  None
+            keeps the current selection.
+        """
+        if sensors is None:
+            return
+
+        selected = select_headers(self.headers, sensors)
+        if self.data is not None:
+            self.headers = [self.headers[i] for i in selected]
+            self.data = self.data[:, selected]
+            self.point_data = None
+        else:
+            self.selected = selected
+        self.index = header_index(self.headers, self.selected)
+
     def __iter__(self):
         return self
 
+    def __map_row(self):
+        if self.row_index >= len(self.data):
+            raise EOFError('That\'s all the data!')
+
+        index, points = self.index
+        if self.point_data is None:
+            # Converted once, for the rows with coordinates only
+            point_data = self.data[:, points]
+            present = ~np.isnan(point_data)
+            point_data[present] = ddmm_to_decimal(point_data[present])
+            rows = np.flatnonzero(present.any(axis=1))
+            self.point_data = dict(zip(
+                rows.tolist(), point_data[rows].tolist()
+            ))
+
+        values = self.data[self.row_index].tolist()
+        degrees = self.point_data.get(self.row_index)
+        self.row_index += 1
+
+        if degrees is not None:
+            for i, value in zip(points, degrees):
+                values[i] = value
+        return map_row(values, index, ())
+
     def __next__(self):
         if self.finished:
             raise StopIteration
 
         try:
-            value = map_line(self.reader, self.headers)
+            if self.data is not None:
+                value = self.__map_row()
+            else:
+                value = map_line(
+                    self.reader, self.headers, self.selected, self.index
+                )
             return value
         except EOFError:
-            self.finished = True
+            self.close()
             raise StopIteration
     next = __next__
 
+    def close(self):
+        """Stops reading, releasing a streaming dbd2asc process if any
+        """
+        self.finished = True
+        if hasattr(self.reader, 'close'):
+            self.reader.close()
+
+    def read_columns(self):
+        """Reads all remaining rows at once as columns
+
+        Consumes the reader.
+
+        Returns
+        -------
+        dict
+            Mapping of <sensor>-<units> keys (and 'timestamp') to float64
+            arrays with NaN for missing values
+        """
+        if self.finished:
+            values = np.empty((0, len(self.headers)))
+        elif self.data is not None:
+            values = self.data[self.row_index:]
+            self.row_index = len(self.data)
+        else:
+            values = read_values(self.reader, self.headers)
+
+        self.close()
+
+        headers = self.headers
+        if self.selected is not None:
+            headers = [self.headers[i] for i in self.selected]
+            values = values[:, self.selected]
+
+        return map_columns(values, headers)
+
 
 class MergedGliderBDReader(object):
     """Merges flight and science data readers to return merged glider data.
@@ -57,18 +189,30 @@ class MergedGliderBDReader(object):
     science_reader - A GliderBDReader object tied to science data *bd files.
     merge_tolerance - An optional tolerance number of seconds to consider two
         rows mergeable.  Default: 1
+    sensors - An optional whitelist of sensor names or <sensor>-<units> keys
+        applied to both readers.  Default: all sensors
     """
 
-    def __init__(self, flight_reader, science_reader, merge_tolerance=1):
+    def __init__(self, flight_reader, science_reader, merge_tolerance=1,
+                 sensors=None):
         self.flight_reader = flight_reader
         self.science_reader = science_reader
         self.merge_tolerance = merge_tolerance
 
+        flight_reader.select_sensors(sensors)
+        science_reader.select_sensors(sensors)
+
         self.flight_headers = flight_reader.headers
         self.science_headers = science_reader.headers
         self.headers = self.flight_headers + self.science_headers
 
-        self.__read_both_values()
+        # The first rows are only read once iterating starts, so read_columns
+        # can merge whole columns instead
+        self.started = False
+        self.flight_values = None
+        self.science_values = None
+        # Index of the merged rows, for the indexes of the rows it merges
+        self.__merged_index = None
 
     def __read_both_values(self):
         self.__read_flight_values()
@@ -90,6 +234,10 @@ class MergedGliderBDReader(object):
         return self
 
     def __next__(self):
+        if not self.started:
+            self.started = True
+            self.__read_both_values()
+
         if self.flight_values is not None or self.science_values is not None:
             ret_val = {}
 
@@ -114,8 +262,9 @@ class MergedGliderBDReader(object):
 
                 # Can merge because within tolerance
                 if time_diff <= self.merge_tolerance:
-                    ret_val = self.flight_values
-                    ret_val.update(self.science_values)
+                    ret_val = self.__merge_values(
+                        self.flight_values, self.science_values
+                    )
                     self.__read_both_values()
 
                 # Flight is ahead of science.  Return and get next science.
@@ -132,3 +281,70 @@ class MergedGliderBDReader(object):
         else:
             raise StopIteration
     next = __next__
+
+    def __merge_values(self, flight_values, science_values):
+        """Merges a flight and a science row, science values first
+
+        GliderRow rows are merged into one list of values over an index of
+        both rows, computed once.  Other rows are merged as dictionaries.
+        """
+        if not (isinstance(flight_values, GliderRow) and
+                isinstance(science_values, GliderRow)):
+            flight_values.update(science_values)
+            return flight_values
+
+        flight_index = flight_values.index
+        science_index = science_values.index
+        merged = self.__merged_index
+        if merged is None or merged[0] is not flight_index or \
+                merged[1] is not science_index:
+            # Keys of both rows point to the science value, the flight
+            # value fills it in where it is missing
+            offset = len(flight_values.values)
+            index = dict(flight_index)
+            shared = []
+            for key, position in science_index.items():
+                if key in flight_index:
+                    shared.append((flight_index[key], offset + position))
+                index[key] = offset + position
+            merged = (flight_index, science_index, index, shared)
+            self.__merged_index = merged
+
+        values = list(flight_values.values)
+        values.extend(science_values.values)
+        for flight_position, science_position in merged[3]:
+            value = values[science_position]
+            if value != value:
+                values[science_position] = values[flight_position]
+
+        row = GliderRow(merged[2], values)
+        if flight_values.extra is not None or \
+                science_values.extra is not None:
+            row.extra = {
+                key: value
+                for key, value in (flight_values.extra or {}).items()
+                if key not in science_values
+            }
+            row.extra.update(science_values.extra or {})
+        return row
+
+    def read_columns(self):
+        """Reads all remaining merged rows at once as columns
+
+        Consumes the reader.  The columns of both readers are merged at once
+        with merge_columns, unless rows were already iterated.
+
+        Returns
+        -------
+        dict
+            Mapping of <sensor>-<units> keys (and 'timestamp') to float64
+            arrays with NaN for missing values
+        """
+        if self.started:
+            return rows_to_columns(self)
+
+        self.started = True
+        return merge_columns([
+            self.flight_reader.read_columns(),
+            self.science_reader.read_columns()
+        ], self.merge_tolerance)
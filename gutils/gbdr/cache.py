@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+import os
+import json
+import hashlib
+from glob import glob
+
+import numpy as np
+
+from gutils.gbdr.methods import (
+    read_glider_BD_file,
+    select_headers
+)
+from gutils.gbdr.decoder import (
+    decode_glider_BD_file,
+    merge_decoded_files
+)
+from gutils.gbdr.sensor_lists import (
+    open_sensor_list_cache,
+    read_glider_BD_header
+)
+
+import logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 1024 ** 3  # 1 GiB
+
+
+class SegmentCache(object):
+    """Persistent on-disk cache of decoded glider binary data files
+
+    Each file is decoded once and stored as a column-major (memory mappable)
+    .npy array next to a JSON list of its sensors.  Entries are keyed by the
+    file path, size, modification time and sensor list CRC, so a changed
+    file is decoded again.  Reading a cached file never runs dbd2asc.
+
+    Arguments:
+    cache_dir - Directory holding the cached files.  Created if missing.
+    max_bytes - Size bound of the cache.  The least recently used files are
+        evicted once it is exceeded.  Default: 1 GiB
+    """
+
+    def __init__(self, cache_dir, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes or DEFAULT_MAX_BYTES
+
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            pass  # Already exists
+
+    def key(self, path, native=False):
+        """Builds the cache key of a glider binary data file
+        """
+        stat = os.stat(path)
+        with open(path, 'rb') as fp:
+            crc = read_glider_BD_header(fp).get('sensor_list_crc', '')
+
+        parts = (
+            os.path.abspath(path),
+            stat.st_size,
+            repr(stat.st_mtime),
+            crc.lower(),
+            'native' if native else 'dbd2asc'
+        )
+        description = '|'.join(str(part) for part in parts)
+        return hashlib.sha1(description.encode('utf-8')).hexdigest()
+
+    def __entry_paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + '.npy', base + '.json'
+
+    def get(self, path, native=False):
+        """Returns the cached (sensors, data) of a file or None
+        """
+        data_path, sensors_path = self.__entry_paths(self.key(path, native))
+
+        try:
+            with open(sensors_path, 'r') as f:
+                sensors = json.load(f)
+            data = np.load(data_path, mmap_mode='r')
+            os.utime(data_path, None)  # Mark as recently used
+        except (IOError, OSError, ValueError):
+            return None
+
+        return sensors, data
+
+    def put(self, path, sensors, data, native=False):
+        """Stores the decoded (sensors, data) of a file
+        """
+        data_path, sensors_path = self.__entry_paths(self.key(path, native))
+        suffix = '.{}.tmp'.format(os.getpid())
+
+        # Sensors first, the data file marks a complete entry
+        with open(sensors_path + suffix, 'w') as f:
+            json.dump(
+                [{'name': s['name'], 'units': s['units']} for s in sensors],
+                f
+            )
+        os.rename(sensors_path + suffix, sensors_path)
+
+        with open(data_path + suffix, 'wb') as f:
+            np.save(f, np.asfortranarray(data))
+        os.rename(data_path + suffix, data_path)
+
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used files until within max_bytes
+        """
+        entries = []
+        total = 0
+        for data_path in glob(os.path.join(self.cache_dir, '*.npy')):
+            sensors_path = data_path[:-len('.npy')] + '.json'
+            try:
+                size = os.path.getsize(data_path)
+                if os.path.isfile(sensors_path):
+                    size += os.path.getsize(sensors_path)
+                entries.append((os.path.getmtime(data_path), size, data_path))
+            except OSError:
+                continue  # Evicted by another process
+            total += size
+
+        for _, size, data_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+
+            for entry_path in (data_path, data_path[:-len('.npy')] + '.json'):
+                try:
+                    os.remove(entry_path)
+                except OSError:
+                    pass
+            total -= size
+            logger.debug("Evicted {} from segment cache".format(data_path))
+
+    def decode(self, path, native=False, cache_path=None):
+        """Returns the (sensors, data) of a file, decoding it on a miss
+
+        cache_path is the sensor list cache used to decode it, see
+        GliderBDReader.
+
+        Raises
+        ------
+        KeyError
+            If it cannot find the sensor list for the file.
+        """
+        cached = self.get(path, native)
+        if cached is not None:
+            return cached
+
+        if native:
+            sensors, data = decode_glider_BD_file(path, cache_path)
+        else:
+            sensors, data = read_glider_BD_file(path, cache_path)
+
+        self.put(path, sensors, data, native)
+        return sensors, data
+
+    def decode_files(self, filePaths, native=False, sensors=None,
+                     cache_path=None):
+        """Returns the combined (headers, data) of a list of files
+
+        Mirrors dbd2asc output for the same file list.  Only the columns of
+        the optional sensor whitelist are read from the cached files.
+        """
+        sensor_lists = open_sensor_list_cache(cache_path)
+        decoded = []
+        for path in filePaths:
+            file_sensors, data = self.decode(path, native, sensor_lists)
+            selected = select_headers(file_sensors, sensors)
+            decoded.append((
+                [file_sensors[i] for i in selected],
+                data[:, selected]
+            ))
+
+        return merge_decoded_files(decoded)
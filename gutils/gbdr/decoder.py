@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+
+import os
+import struct
+
+import numpy as np
+
+from gutils.gbdr.methods import (
+    create_header,
+    select_headers
+)
+from gutils.gbdr.sensor_lists import (
+    open_sensor_list_cache,
+    read_glider_BD_header,
+    read_sensor_lines
+)
+
+# Size of the known bytes cycle that follows the sensor list.  It holds
+# 's', 'a', 0x1234 (int16), 123.456 (float32) and 123456789.12345 (float64)
+# and is only used to detect the byte order of the data cycles.
+KNOWN_BYTES_LENGTH = 16
+
+DATA_CYCLE_TAG = ord('d')
+
+# 2 bit sensor states found in the state bytes of each data cycle
+STATE_NOT_UPDATED = 0
+STATE_SAME_VALUE = 1
+STATE_NEW_VALUE = 2
+
+SENSOR_FORMATS = {
+    1: 'b',
+    2: 'h',
+    4: 'f',
+    8: 'd'
+}
+
+
+def read_glider_BD_sensor_list(lines):
+    """Parses glider sensor list lines
+
+    Parameters
+    ----------
+    lines : list
+        Sensor list lines in the format found in glider binary data files and
+        dbd2asc cache (.cac) files:
+        s: <T|F> <sensor index> <storage index> <bytes> <name> <units>
+
+    Returns
+    -------
+    list
+        Sensors written each cycle, ordered by storage index.  Each sensor is
+        described by a dictionary with the keys 'name', 'units' and 'bytes'.
+    """
+    sensors = []
+    for line in lines:
+        if not line.startswith('s:'):
+            continue
+
+        _, in_cycle, _, storage_index, size, name, units = line.split()
+        if in_cycle == 'T':
+            sensors.append((
+                int(storage_index),
+                {
+                    'name': name,
+                    'units': units,
+                    'bytes': int(size)
+                }
+            ))
+
+    return [sensor for _, sensor in sorted(sensors, key=lambda s: s[0])]
+
+
+def find_factored_sensor_list(path, crc, cache_path=None):
+    """Finds the sensor list of a file that does not carry one itself
+
+    Looks in the cache first and then reads it from an indexed file of the
+    same directory carrying the full sensor list.  Only file headers are
+    read.
+
+    Raises
+    ------
+    KeyError
+        If no sensor list can be found for the given data file.
+    """
+    return open_sensor_list_cache(cache_path).find(crc, path)
+
+
+def read_known_bytes(fp):
+    known_bytes = bytearray(fp.read(KNOWN_BYTES_LENGTH))
+    if len(known_bytes) < KNOWN_BYTES_LENGTH or known_bytes[0] != ord('s'):
+        raise ValueError('Known bytes cycle not found')
+
+    if known_bytes[2:4] == bytearray(b'\x12\x34'):
+        return '>'
+    elif known_bytes[2:4] == bytearray(b'\x34\x12'):
+        return '<'
+    else:
+        raise ValueError('Unable to determine byte order from known bytes')
+
+
+def compile_cycle(state_bytes, sensors, byte_order, positions):
+    """Builds the struct used to unpack a data cycle with the given states
+
+    Parameters
+    ----------
+    state_bytes : bytearray
+        State bytes of the data cycle
+    sensors : list
+        Sensors written each cycle
+    byte_order : str
+        struct byte order character
+    positions : list
+        Output column of each sensor, or -1 for sensors that are not kept
+
+    Returns
+    -------
+    tuple
+        (new_columns, value_indices, same_columns, unpacker) where
+        new_columns are the output columns updated with a new value,
+        value_indices the indices of those values in the unpacked cycle,
+        same_columns the output columns updated with their previous value and
+        unpacker a struct.Struct for all of the new values in the cycle.
+    """
+    new_columns = []
+    value_indices = []
+    same_columns = []
+    formats = [byte_order]
+    for i, sensor in enumerate(sensors):
+        state = (state_bytes[i >> 2] >> (6 - 2 * (i & 3))) & 3
+        if state == STATE_NEW_VALUE:
+            if positions[i] >= 0:
+                new_columns.append(positions[i])
+                value_indices.append(len(formats) - 1)
+            formats.append(SENSOR_FORMATS[sensor['bytes']])
+        elif state == STATE_SAME_VALUE and positions[i] >= 0:
+            same_columns.append(positions[i])
+
+    return (
+        np.array(new_columns, dtype=np.intp),
+        np.array(value_indices, dtype=np.intp),
+        np.array(same_columns, dtype=np.intp),
+        struct.Struct(''.join(formats))
+    )
+
+
+def fill_same_values(data, new_mask, same_mask):
+    """Fills sensors updated with their previous value in place
+
+    The previous value is the last one written with a new value state.
+    """
+    rows = np.arange(len(data))[:, None]
+    last_new = np.where(new_mask, rows, 0)
+    np.maximum.accumulate(last_new, axis=0, out=last_new)
+
+    same_rows, same_columns = np.nonzero(same_mask)
+    data[same_rows, same_columns] = data[
+        last_new[same_rows, same_columns],
+        same_columns
+    ]
+
+
+def decode_cycles(buf, sensors, state_bytes_per_cycle, byte_order,
+                  selected=None, output_initial_values=False):
+    """Decodes the bit-packed data cycles of a glider binary data file
+
+    Each distinct state byte pattern is compiled to a struct once.  Rows
+    sharing a pattern are then written to the output array together.
+
+    Like dbd2asc, sensors updated with their previous value repeat it and
+    the initial values cycle is dropped unless output_initial_values is set.
+
+    Parameters
+    ----------
+    selected : list
+        Optional indices of the only sensors to output.  Default: all
+
+    Returns
+    -------
+    numpy.ndarray
+        Rows x selected sensors float64 array.  Sensors not updated during a
+        cycle are NaN.
+    """
+    if selected is None:
+        selected = range(len(sensors))
+
+    positions = [-1] * len(sensors)
+    for column, i in enumerate(selected):
+        positions[i] = column
+
+    cycles = {}
+    groups = []
+    num_rows = 0
+    offset = 0
+    buf_length = len(buf)
+
+    while offset < buf_length and buf[offset] == DATA_CYCLE_TAG:
+        state_start = offset + 1
+        values_start = state_start + state_bytes_per_cycle
+        key = bytes(buf[state_start:values_start])
+
+        cycle = cycles.get(key)
+        if cycle is None:
+            cycle = cycles[key] = compile_cycle(
+                bytearray(key), sensors, byte_order, positions
+            ) + ([], [])
+            groups.append(cycle)
+
+        unpacker, rows, values = cycle[3:]
+        if values_start + unpacker.size > buf_length:
+            break  # Truncated cycle at the end of a partial file
+
+        values.append(unpacker.unpack_from(buf, values_start))
+        rows.append(num_rows)
+        num_rows += 1
+
+        offset = values_start + unpacker.size
+
+    data = np.full((num_rows, len(selected)), np.nan)
+    new_mask = np.zeros(data.shape, dtype=bool)
+    same_mask = np.zeros(data.shape, dtype=bool)
+    for new_columns, value_indices, same_columns, _, rows, values in groups:
+        rows = np.array(rows)[:, None]
+        if len(new_columns):
+            data[rows, new_columns] = np.array(values)[:, value_indices]
+            new_mask[rows, new_columns] = True
+        if len(same_columns):
+            same_mask[rows, same_columns] = True
+
+    if same_mask.any():
+        fill_same_values(data, new_mask, same_mask)
+
+    if not output_initial_values:
+        data = data[1:]
+
+    return data
+
+
+def decode_glider_BD_file(path, cache_path=None, sensors=None):
+    """Decodes a single glider binary data file without dbd2asc
+
+    Supports .sbd/.tbd/.dbd/.ebd/.mbd/.nbd files.  Files with a factored
+    sensor list are resolved through dbd2asc compatible cache (.cac) files
+    in cache_path.  Full sensor lists missing from the cache are written to
+    it as they are read, just like dbd2asc does.
+
+    Parameters
+    ----------
+    path : str
+        Path to a glider binary data file
+    cache_path : str or SensorListCache
+        Directory holding sensor list cache files, or its SensorListCache.
+        Default: the system temporary directory
+    sensors : iterable
+        Optional whitelist of sensor names or <sensor>-<units> keys to decode
+
+    Returns
+    -------
+    tuple
+        (sensors, data) where sensors is the list of selected sensors written
+        each cycle and data is a rows x sensors float64 array.
+
+    Raises
+    ------
+    KeyError
+        If a factored sensor list cannot be found for the given data file.
+    """
+    sensor_lists = open_sensor_list_cache(cache_path)
+    with open(path, 'rb') as fp:
+        header = read_glider_BD_header(fp)
+        crc = header['sensor_list_crc']
+
+        if header.get('sensor_list_factored') == '1':
+            lines = sensor_lists.find(crc, path)
+        else:
+            lines = read_sensor_lines(fp, header)
+            if not os.path.isfile(sensor_lists.path(crc)):
+                sensor_lists.write(lines, crc)
+
+        byte_order = read_known_bytes(fp)
+        buf = bytearray(fp.read())
+
+    cycle_sensors = read_glider_BD_sensor_list(lines)
+    selected = select_headers(cycle_sensors, sensors)
+    data = decode_cycles(
+        buf,
+        cycle_sensors,
+        int(header['state_bytes_per_cycle']),
+        byte_order,
+        selected
+    )
+
+    return [cycle_sensors[i] for i in selected], data
+
+
+def merge_decoded_files(decoded):
+    """Combines decoded glider binary data files the way dbd2asc does
+
+    Parameters
+    ----------
+    decoded : list
+        (sensors, data) pairs, one per file, in file order.  Sensors are
+        dictionaries with at least the keys 'name' and 'units'.
+
+    Returns
+    -------
+    tuple
+        (headers, data) with the union of all sensors, sorted by name, and
+        the rows of every file in order.
+    """
+    units = {}
+    for sensors, _ in decoded:
+        for sensor in sensors:
+            units.setdefault(sensor['name'], sensor['units'])
+
+    names = sorted(units)
+    headers = [create_header(name, units[name]) for name in names]
+    positions = {name: i for i, name in enumerate(names)}
+
+    num_rows = sum(len(data) for _, data in decoded)
+    merged = np.full((num_rows, len(names)), np.nan)
+
+    start = 0
+    for sensors, data in decoded:
+        columns = [positions[sensor['name']] for sensor in sensors]
+        merged[start:start + len(data), columns] = data
+        start += len(data)
+
+    return headers, merged
+
+
+def decode_glider_BD_files(filePaths, cache_path=None, sensors=None):
+    """Decodes a list of glider binary data files without dbd2asc
+
+    Mirrors the dbd2asc output for the same file list: the union of all
+    sensors, sorted by name, and the rows of every file in order.  Only
+    sensors in the optional whitelist are output.
+
+    Returns
+    -------
+    tuple
+        (headers, data) where headers has the same format as
+        find_glider_BD_headers and data is a rows x headers float64 array
+        of raw values (NaN where a sensor was not updated).
+
+    Raises
+    ------
+    KeyError
+        If it cannot find the sensor list for a given file.
+    """
+    sensor_lists = open_sensor_list_cache(cache_path)
+    return merge_decoded_files([
+        decode_glider_BD_file(p, sensor_lists, sensors) for p in filePaths
+    ])
@@ -2,15 +2,33 @@
 
 import re
 import os
+import heapq
 import subprocess
 from glob import glob
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping  # Python 2
 from whichcraft import which
 from six import StringIO
 
+import numpy as np
+
+from gutils.gbdr.sensor_lists import open_sensor_list_cache
+
 dbd2asc_path = which('dbd2asc')  # conda
 if dbd2asc_path is None:
     dbd2asc_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bin', 'dbd2asc')  # pip
 
+# Sensors providing the generic 'timestamp' value
+TIME_SENSORS = ('m_present_time', 'sci_m_present_time')
+
+# Number of characters of dbd2asc output parsed at once by read_values
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Decimals of the minutes kept by ddmm_to_decimal
+MINUTE_DECIMALS = 10
+
 
 def parse_glider_filename(filename):
     """
@@ -92,30 +110,130 @@ def generate_stream(processArgs):
     return StringIO(stdout), process.returncode
 
 
-def can_find_bd_index(path):
-    # Iterate through previous segment files
-    processArgs = [dbd2asc_path, '-c', '/tmp', path]
-    returncode = 1
-    file_details = parse_glider_filename(path)
-    while returncode == 1 and file_details['segment'] >= 0:
-        processArgs[3] = generate_glider_filename(file_details)
-        stream, returncode = generate_stream(processArgs)
-        file_details['segment'] -= 1
+class ProcessStream(object):
+    """File like reader over the output of a running process
+
+    Lines are read from the process pipe as they are requested, so memory
+    stays bounded and the first line is available before the process
+    finishes.  The process is waited on once its output is exhausted.
+
+    Arguments:
+    process - A subprocess.Popen with text stdout.
+    lines - Lines already read from the process, returned first.
+    cleanup - An optional function called once the process exited.
+    """
+
+    def __init__(self, process, lines=None, cleanup=None):
+        self.process = process
+        self.pending = list(lines or [])
+        self.cleanup = cleanup
+
+    def readline(self):
+        if self.pending:
+            return self.pending.pop(0)
+
+        if self.process.stdout.closed:
+            return ''
+
+        line = self.process.stdout.readline()
+        if not line:
+            self.__finish()
+        return line
+
+    def readlines(self, hint=-1):
+        lines = []
+        size = 0
+        line = self.readline()
+        while line:
+            lines.append(line)
+            size += len(line)
+            if 0 < hint <= size:
+                break
+            line = self.readline()
+        return lines
+
+    def read(self):
+        return ''.join(self.readlines())
+
+    def __finish(self):
+        self.process.stdout.close()
+        returncode = self.process.wait()
+        if self.cleanup is not None:
+            cleanup, self.cleanup = self.cleanup, None
+            cleanup()
+        return returncode
+
+    def close(self):
+        """Closes the pipe and reaps the process, killing it if still running
+        """
+        if self.process.poll() is None:
+            self.process.kill()
+        return self.__finish()
+
+
+def generate_process_stream(processArgs, cleanup=None):
+    """ Runs a given process and streams its output
+
+    Output is buffered only until the first dbd2asc label line, which is
+    written once every input file has been indexed.
+
+    Parameters
+    ----------
+    processArgs : list
+        Arguments to run in a process
+    cleanup : callable
+        Optional function called once the process exited
+
+    Returns
+    -------
+    tuple
+        (stream, returncode) where stream is a ProcessStream.  returncode is
+        0 while the process is producing data, otherwise the code the
+        process exited with before producing any.
+    """
+    process = subprocess.Popen(processArgs, universal_newlines=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+    lines = []
+    line = process.stdout.readline()
+    while line:
+        lines.append(line)
+        if line.startswith('dbd_label'):
+            return ProcessStream(process, lines, cleanup), 0
+        line = process.stdout.readline()
+
+    process.stdout.close()
+    returncode = process.wait()
+    if cleanup is not None:
+        cleanup()
+    return ProcessStream(process, lines), returncode
 
-    # Report whether index found or not
-    return returncode == 0
 
+def can_find_bd_index(path, cache_path=None):
+    """Reports whether the sensor list of a glider data file can be found
 
-def process_file(path):
+    Caches it from an indexed file carrying it when missing, see
+    SensorListCache.find.
+    """
+    try:
+        open_sensor_list_cache(cache_path).prepare([path])
+    except KeyError:
+        return False
+    return True
+
+
+def process_file(path, cache_path=None):
     """Processes a single glider data file.
 
-    Intelligently falls back if previous index file has not
-    been processed for given data file.
+    A missing sensor list is cached from the file carrying it before
+    running dbd2asc.
 
     Parameters
     ----------
     path : str
         Path to a glider data file
+    cache_path : str or SensorListCache
+        Sensor list cache (.cac) directory, or its SensorListCache.
+        Default: the system temporary directory
 
     Returns
     -------
@@ -124,59 +242,56 @@ def process_file(path):
 
     Raises
     ------
-    ValueError
+    KeyError
         If data index cannot be found for given data file.
     """
-    processArgs = [dbd2asc_path, '-c', '/tmp', path]
-    stream, returncode = generate_stream(processArgs)
-
-    # Fallback to find index bd file
-    if returncode == 1:
-        if can_find_bd_index(path):
-            stream, returncode = generate_stream(processArgs)
-        else:
-            raise KeyError("Cannot find data file index for: %s" % path)
-
-    return stream
+    return process_file_list([path], cache_path=cache_path)
 
 
-def process_all_of_type(path, extension):
+def process_all_of_type(path, extension, cache_path=None):
     """Process glider data files of one type
 
-    No fallback.  Assumed that operation big enough to avoid this issue.
-
     Parameters
     ----------
     path : str
         Path to a folder of glider data files
     extension: str
         Extension for the type of glider you wish to process
+    cache_path : str or SensorListCache
+        Sensor list cache (.cac) directory, or its SensorListCache.
+        Default: the system temporary directory
 
     Returns
     -------
     StringIO
         Resulting text
     """
-    processArgs = [dbd2asc_path, '-c', '/tmp']
     filesWildCard = '%s/*.%s' % (path, extension)
-    processArgs.extend(glob(filesWildCard))
-    stream, returncode = generate_stream(processArgs)
-    return stream
+    return process_file_list(glob(filesWildCard), cache_path=cache_path)
 
 
-def process_file_list(filePaths):
+def process_file_list(filePaths, stream=False, cache_path=None):
     """Process a list of glider data files to ASCII.
 
-    Intelligently falls back for each file if necessary.
+    The sensor lists of all files are cached beforehand, each missing one
+    read from a single file carrying it, so dbd2asc runs once.  dbd2asc
+    reads a private copy of the cache files, which it rewrites in place,
+    removed once it exited.
 
     Parameters
     ----------
     filePaths : list
         List of glider data files to process to ASCII
+    stream : bool
+        Read the output from the dbd2asc pipe as it is consumed instead of
+        buffering all of it
+    cache_path : str or SensorListCache
+        Sensor list cache (.cac) directory, or its SensorListCache.
+        Default: the system temporary directory
 
     Returns
     -------
-    StringIO
+    StringIO or ProcessStream
         Resulting text
 
     Raises
@@ -184,38 +299,42 @@ def process_file_list(filePaths):
     KeyError
         If it cannot generate an index for a given file.
     """
-    processArgs = [dbd2asc_path, '-c', '/tmp']
+    sensor_lists = open_sensor_list_cache(cache_path)
+    private_path = sensor_lists.checkout(filePaths)
 
-    for filePath in filePaths:
-        processArgs.append(filePath)
+    processArgs = [dbd2asc_path, '-c', private_path]
+    processArgs.extend(filePaths)
 
-    stream, returncode = generate_stream(processArgs)
+    def release():
+        sensor_lists.release(private_path)
 
-    # Fallback in case the cache is not available
-    if returncode == 1:
-        for filePath in filePaths:
-            if not can_find_bd_index(filePath):
-                raise KeyError(
-                    "Cannot find data file index for: {}".format(filePath)
-                )
+    if stream:
+        reader, returncode = generate_process_stream(processArgs, release)
+        return reader
 
-        # Reprocess the file list
-        stream, returncode = generate_stream(processArgs)
-
-    return stream
+    try:
+        reader, returncode = generate_stream(processArgs)
+    finally:
+        release()
+    return reader
 
 
-def create_glider_BD_ASCII_reader(filePaths):
+def create_glider_BD_ASCII_reader(filePaths, stream=False, cache_path=None):
     """Creates a glider binary data reader over a set of files
 
     Parameters
     ----------
     filePaths : list
         List of glider data files to process to ASCII
+    stream : bool
+        Stream the dbd2asc output instead of buffering all of it
+    cache_path : str or SensorListCache
+        Sensor list cache (.cac) directory, or its SensorListCache.
+        Default: the system temporary directory
 
     Returns
     -------
-    StringIO
+    StringIO or ProcessStream
         Resulting text
 
     Raises
@@ -223,7 +342,29 @@ def create_glider_BD_ASCII_reader(filePaths):
     KeyError
         If it cannot generate an index for a given file.
     """
-    return process_file_list(filePaths)
+    return process_file_list(filePaths, stream, cache_path)
+
+
+def create_header(name, units):
+    """Creates a header description for a glider sensor
+
+    Parameters
+    ----------
+    name : str
+        Sensor name
+    units : str
+        Sensor units
+
+    Returns
+    -------
+    dict
+        Header description with the keys 'name', 'units' and 'is_point'
+    """
+    return {
+        'name': name,
+        'units': units,
+        'is_point': name.find('lat') != -1 or name.find('lon') != -1
+    }
 
 
 def find_glider_BD_headers(reader):
@@ -265,12 +406,7 @@ def find_glider_BD_headers(reader):
     headers = []
     for header, unit in zip(headersTemp, unitsTemp):
         if header and unit:
-            description = {
-                'name': header,
-                'units': unit,
-                'is_point': header.find('lat') != -1 or header.find('lon') != -1
-            }
-            headers.append(description)
+            headers.append(create_header(header, unit))
 
     # Remove extraneous bytes line
     reader.readline()
@@ -278,49 +414,241 @@ def find_glider_BD_headers(reader):
     return headers
 
 
+def ddmm_to_decimal(values):
+    """Converts glider GPS coordinates ddmm.mmm to decimal degrees dd.ddd
+
+    The degrees are the hundreds of the absolute value and the rest are
+    minutes.  The minutes are rounded to MINUTE_DECIMALS decimals to drop
+    the representation error of the subtraction (8330.567 gives 30.567
+    minutes, not 30.567000000000007).
+
+    Parameters
+    ----------
+    values : array_like
+        Glider GPS coordinates (ddmm.mmm)
+
+    Returns
+    -------
+    numpy.ndarray
+        Decimal degree coordinates (dd.ddd).  0 and infinite values, which
+        are not positions, become -1 and NaN stays NaN.  The 69696969 no fix
+        sentinel becomes 696970.15 and is dropped by filter_locations.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    magnitudes = np.abs(values)
+
+    # Infinite values give NaN minutes, replaced by -1 below
+    with np.errstate(invalid='ignore'):
+        degrees = np.floor(magnitudes / 100)
+        minutes = np.round(magnitudes - degrees * 100, MINUTE_DECIMALS)
+
+    decimal = np.copysign(degrees + minutes / 60, values)
+    return np.where((values == 0) | np.isinf(values), -1.0, decimal)
+
+
 def get_decimal_degrees(lat_lon):
     """Converts glider gps coordinate ddmm.mmm to decimal degrees dd.ddd
 
     Parameters
     ----------
-    lat_lon : str
+    lat_lon : float
         Glider GPS coordinate (ddmm.mmm)
 
     Returns
     -------
     float
-        Decimal degree coordinate (dd.ddd)
+        Decimal degree coordinate (dd.ddd), see ddmm_to_decimal
     """
 
-    if lat_lon == 0:
-        return -1
-
-    lat_lon_string = str(lat_lon)
-    decimal_place = lat_lon_string.find('.')
-    if decimal_place != -1:
-        str_dec = lat_lon_string[0:decimal_place - 2]
-        str_dec_fractional = lat_lon_string[decimal_place - 2:]
-    elif abs(lat_lon) < 181:
-        if(abs(lat_lon / 100) > 100):
-            str_dec = lat_lon_string[0:3]
-            str_dec_fractional = lat_lon_string[3:]
-        else:
-            str_dec = lat_lon_string[0:2]
-            str_dec_fractional = lat_lon_string[2:]
-    else:
-        return -1
+    return float(ddmm_to_decimal(lat_lon))
 
-    try:
-        dec = float(str_dec)
-        dec_fractional = float(str_dec_fractional)
-        if dec < 0:
-            dec_fractional *= -1
-        return dec + dec_fractional / 60
-    except ValueError:
-        return None
 
+def select_headers(headers, sensors=None):
+    """Finds the headers to map given a sensor whitelist
+
+    Time sensors are always selected so a generic timestamp can be provided.
+
+    Parameters
+    ----------
+    headers : list
+        Headers discovered in data file
+    sensors : iterable
+        Optional whitelist of sensor names or <sensor>-<units> keys.
+        Default: all sensors
+
+    Returns
+    -------
+    list
+        Indices of the selected headers
+    """
+    if sensors is None:
+        return list(range(len(headers)))
+
+    sensors = set(sensors)
+    return [
+        i for i, header in enumerate(headers)
+        if header['name'] in TIME_SENSORS or
+        header['name'] in sensors or
+        header['name'] + "-" + header['units'] in sensors
+    ]
+
+
+class GliderRow(MutableMapping):
+    """One row of glider data values, used like a row dictionary
+
+    Holds the list of values of the row and an index shared by every row of
+    a reader, mapping <sensor>-<units> keys to value positions, instead of a
+    dictionary of its own.  NaN values are missing, like the keys left out
+    of row dictionaries.  Keys set on a row are kept in a dictionary of its
+    own.
+
+    Arguments:
+    index - Mapping of keys to positions in values, see header_index.
+    values - List or tuple of the values of the row.
+    """
+
+    __slots__ = ('index', 'values', 'extra')
+
+    def __init__(self, index, values):
+        self.index = index
+        self.values = values
+        self.extra = None
+
+    def __getitem__(self, key):
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        value = self.values[self.index[key]]
+        if value != value:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        if self.extra is not None and key in self.extra:
+            return True
+        position = self.index.get(key)
+        if position is None:
+            return False
+        value = self.values[position]
+        return value == value
+
+    def get(self, key, default=None):
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        position = self.index.get(key)
+        if position is None:
+            return default
+        value = self.values[position]
+        return value if value == value else default
+
+    def __setitem__(self, key, value):
+        if self.extra is None:
+            self.extra = {}
+        self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if self.extra is not None and key in self.extra:
+            del self.extra[key]
+        if key in self.index:
+            self.values = list(self.values)
+            self.values[self.index[key]] = np.nan
+
+    def items(self):
+        values = self.values
+        extra = self.extra
+        items = [
+            (key, values[position])
+            for key, position in self.index.items()
+            if values[position] == values[position] and
+            (extra is None or key not in extra)
+        ]
+        if extra is not None:
+            items.extend(extra.items())
+        return items
+
+    def __iter__(self):
+        return iter([key for key, _ in self.items()])
+
+    def __len__(self):
+        return len(self.items())
+
+    def __repr__(self):
+        return 'GliderRow({!r})'.format(dict(self.items()))
+
+
+def header_index(headers, selected=None):
+    """Builds the index shared by the GliderRow of a reader
+
+    Parameters
+    ----------
+    headers : list
+        Headers discovered in data file
+    selected : list
+        Optional indices of the only headers to map (see select_headers)
+
+    Returns
+    -------
+    tuple
+        (index, points): the mapping of <sensor>-<units> keys to positions
+        in the values of a row, with 'timestamp' after the last header, and
+        the positions of the GPS coordinate values
+    """
+    if selected is None:
+        selected = range(len(headers))
+
+    index = {}
+    points = []
+    for i in selected:
+        header = headers[i]
+        index[header['name'] + "-" + header['units']] = i
+        if header['is_point']:
+            points.append(i)
+    index['timestamp'] = len(headers)
+
+    return index, points
+
+
+def map_row(values, index, points):
+    """Maps the values of a row to a GliderRow
+
+    Converts GPS coordinates to decimal degrees and appends the generic
+    timestamp, both in place.
+
+    Parameters
+    ----------
+    values : list
+        Values of every header of the row, NaN where missing
+    index, points
+        As returned by header_index
+
+    Returns
+    -------
+    GliderRow
+        The row of values
+    """
+
+    present = [i for i in points if values[i] == values[i]]
+    if present:
+        degrees = ddmm_to_decimal([values[i] for i in present]).tolist()
+        for i, value in zip(present, degrees):
+            values[i] = value
 
-def map_line(reader, headers):
+    # Provide generic timestamp regardless of type for iterator
+    # convenience
+    # Keep originals for those interested
+    timestamp = np.nan
+    for key in ('m_present_time-timestamp', 'sci_m_present_time-timestamp'):
+        position = index.get(key)
+        if position is not None and values[position] == values[position]:
+            timestamp = values[position]
+            break
+    values.append(timestamp)
+
+    return GliderRow(index, values)
+
+
+def map_line(reader, headers, selected=None, index=None):
     """Maps all non-NaN values in a glider data file to a known header
 
     Parameters
@@ -329,39 +657,459 @@ def map_line(reader, headers):
         Glider binary data reader output
     headers : list
         Headers discovered in data file
+    selected : list
+        Optional indices of the only headers to map (see select_headers)
+    index : tuple
+        Optional (index, points) of the headers as returned by header_index,
+        to share between the rows of a reader
 
     Returns
     -------
-    dict
+    GliderRow
         Mapping of glider data to a known header
     """
 
-    readings = {}
-
     line = reader.readline()
 
     if len(line) == 0:
         raise EOFError('That\'s all the data!')
 
-    line = line.rstrip()
+    if index is None:
+        index = header_index(headers, selected)
+
+    value_strings = line.rstrip().split(' ')
+    num_values = min(len(value_strings), len(headers))
+    if selected is None:
+        values = [float(string) for string in value_strings[:num_values]]
+        values.extend([np.nan] * (len(headers) - num_values))
+    else:
+        values = [np.nan] * len(headers)
+        for i in selected:
+            if i < num_values:
+                values[i] = float(value_strings[i])
 
-    value_strings = line.split(' ')
-    for i, string in enumerate(value_strings):
-        if string != 'NaN':
-            value = float(string)
+    return map_row(values, index[0], index[1])
 
-            if i < len(headers):
-                if headers[i]['is_point']:
-                    value = get_decimal_degrees(value)
-                key = headers[i]['name'] + "-" + headers[i]['units']
-                readings[key] = value
 
-    # Provide generic timestamp regardless of type for iterator
-    # convenience
-    # Keep originals for those interested
-    if 'm_present_time-timestamp' in readings:
-        readings['timestamp'] = readings['m_present_time-timestamp']
-    elif 'sci_m_present_time-timestamp' in readings:
-        readings['timestamp'] = readings['sci_m_present_time-timestamp']
+def read_values(reader, headers):
+    """Parses the remaining glider data lines in one vectorized pass
+
+    Parameters
+    ----------
+    reader : StringIO
+        Glider binary data reader output positioned after the headers
+    headers : list
+        Headers discovered in data file
+
+    Returns
+    -------
+    numpy.ndarray
+        Rows x headers float64 array of values (NaN where missing)
+
+    Raises
+    ------
+    ValueError
+        If the number of values read does not fill the last row
+    """
+    chunks = []
+    lines = reader.readlines(READ_CHUNK_SIZE)
+    while lines:
+        chunks.append(np.fromstring(''.join(lines), sep=' '))
+        lines = reader.readlines(READ_CHUNK_SIZE)
+
+    values = np.concatenate(chunks) if chunks else np.empty(0)
+
+    if len(headers) == 0:
+        return values.reshape(0, 0)
+
+    if len(values) % len(headers) != 0:
+        raise ValueError(
+            'Read {} values which do not fit {} headers'.format(
+                len(values), len(headers)
+            )
+        )
+
+    return values.reshape(-1, len(headers))
+
+
+def map_columns(values, headers):
+    """Maps columns of glider data values to their known headers
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Rows x headers array of glider data values (NaN where missing)
+    headers : list
+        Headers discovered in data file
+
+    Returns
+    -------
+    dict
+        Mapping of <sensor>-<units> keys to float64 arrays, including a
+        generic 'timestamp' column, with NaN for missing values
+    """
+
+    columns = {}
+    for i, header in enumerate(headers):
+        column = np.array(values[:, i], dtype=np.float64)
+        if header['is_point']:
+            present = ~np.isnan(column)
+            column[present] = ddmm_to_decimal(column[present])
+        columns[header['name'] + "-" + header['units']] = column
+
+    # Provide generic timestamp the same way map_line does
+    if 'm_present_time-timestamp' in columns:
+        timestamp = columns['m_present_time-timestamp'].copy()
+        if 'sci_m_present_time-timestamp' in columns:
+            missing = np.isnan(timestamp)
+            timestamp[missing] = (
+                columns['sci_m_present_time-timestamp'][missing]
+            )
+        columns['timestamp'] = timestamp
+    elif 'sci_m_present_time-timestamp' in columns:
+        columns['timestamp'] = columns['sci_m_present_time-timestamp'].copy()
+
+    return columns
+
+
+def read_glider_BD_file(path, cache_path=None):
+    """Converts a single glider data file to an array of values with dbd2asc
+
+    Parameters
+    ----------
+    path : str
+        Path to a glider data file
+    cache_path : str or SensorListCache
+        Sensor list cache (.cac) directory, or its SensorListCache.
+        Default: the system temporary directory
+
+    Returns
+    -------
+    tuple
+        (headers, values) as returned by find_glider_BD_headers and
+        read_values
+
+    Raises
+    ------
+    KeyError
+        If data index cannot be found for given data file.
+    """
+    reader = process_file(path, cache_path)
+    headers = find_glider_BD_headers(reader)
+    return headers, read_values(reader, headers)
+
+
+def rows_to_columns(rows):
+    """Converts glider data row dictionaries to aligned columns
+
+    Parameters
+    ----------
+    rows : iterable
+        Row dictionaries as returned by the glider data readers
+
+    Returns
+    -------
+    dict
+        Mapping of every key found in the rows to a float64 array with NaN
+        where a row has no value
+    """
+    rows = list(rows)
+    keys = set()
+    for row in rows:
+        keys.update(row)
+
+    return {
+        key: np.array([row.get(key, np.nan) for row in rows], dtype=np.float64)
+        for key in keys
+    }
+
+
+def columns_to_rows(columns):
+    """Iterates aligned columns as glider data row dictionaries
+
+    Parameters
+    ----------
+    columns : dict
+        Mapping of keys to equal length arrays as returned by read_columns
+
+    Returns
+    -------
+    generator
+        GliderRow views of the non-NaN values of each row, like the ones
+        returned by the glider data readers
+    """
+    keys = list(columns)
+    index = {key: i for i, key in enumerate(keys)}
+    values = [columns[key].tolist() for key in keys]
+    for row in zip(*values):
+        yield GliderRow(index, row)
+
+
+def tolerance_windows(times, others, tolerance):
+    """Finds the rows of a timeline within a tolerance of each time
+
+    Parameters
+    ----------
+    times : numpy.ndarray
+        Strictly increasing timestamps
+    others : numpy.ndarray
+        Strictly increasing timestamps searched
+    tolerance : float
+        Tolerance number of seconds
+
+    Returns
+    -------
+    tuple
+        (lo, hi) arrays of the first and past the last row of others within
+        tolerance of each time, as compared by the merge
+    """
+
+    lo = np.searchsorted(others, times - tolerance, side='left')
+    hi = np.searchsorted(others, times + tolerance, side='right')
+
+    def within(rows):
+        found = (rows >= 0) & (rows < len(others))
+        found[found] = (
+            np.abs(times[found] - others[rows[found]]) <= tolerance
+        )
+        return found
+
+    def later(rows):
+        found = (rows >= 0) & (rows < len(others))
+        found[found] = others[rows[found]] > times[found]
+        return found
+
+    # The shifted bounds are rounded, move the edges to the rows the merge
+    # would actually consider within tolerance
+    while True:
+        moved = within(lo - 1)
+        lo[moved] -= 1
+        ahead = (lo < len(others)) & ~within(lo) & ~later(lo)
+        lo[ahead] += 1
+        if not (moved.any() or ahead.any()):
+            break
+    while True:
+        moved = within(hi)
+        hi[moved] += 1
+        behind = (hi > 0) & ~within(hi - 1) & later(hi - 1)
+        hi[behind] -= 1
+        if not (moved.any() or behind.any()):
+            break
+
+    return lo, np.maximum(hi, lo)
+
+
+def merge_timelines(timelines, merge_tolerance=1):
+    """Matches the rows of glider data streams into a merged timeline
+
+    Same merge as MergedGliderBDReader, generalized to any number of
+    streams with a heap of the next row of each: the earliest next row is
+    merged with the next rows of the other streams within merge_tolerance
+    seconds of it.  A row without a timestamp is never merged.
+
+    Two strictly increasing timelines, the usual flight and science files,
+    are matched at once with searchsorted: rows with no row of the other
+    stream within tolerance are never merged and rows with exactly one,
+    which has no other, are always merged together.  Only the remaining
+    rows go through the heap.
+
+    Parameters
+    ----------
+    timelines : list
+        Timestamp array of each stream
+    merge_tolerance : float
+        Tolerance number of seconds to consider two rows mergeable
+
+    Returns
+    -------
+    numpy.ndarray
+        Merged rows x streams array of the row of each stream merged into
+        each merged row, -1 where a stream has none
+    """
+
+    timelines = [np.asarray(times, dtype=np.float64) for times in timelines]
+
+    increasing = all(np.all(np.diff(times) > 0) for times in timelines)
+    if len(timelines) == 2 and increasing:
+        indices = merge_increasing_pair(
+            timelines[0], timelines[1], merge_tolerance
+        )
+        if indices is not None:
+            return indices
+
+    return merge_heap(timelines, merge_tolerance)
+
+
+def merge_increasing_pair(first, second, merge_tolerance=1):
+    """Matches the rows of two strictly increasing timelines at once
+
+    See merge_timelines.
+
+    Returns
+    -------
+    numpy.ndarray
+        Merged rows x 2 array of row indices, or None when merged rows share
+        a timestamp and their order would be ambiguous
+    """
+
+    lo_first, hi_first = tolerance_windows(first, second, merge_tolerance)
+    lo_second, hi_second = tolerance_windows(second, first, merge_tolerance)
+    candidates_first = hi_first - lo_first
+    candidates_second = hi_second - lo_second
+
+    pairs_first = np.flatnonzero(candidates_first == 1)
+    unique = candidates_second[lo_first[pairs_first]] == 1
+    pairs_first = pairs_first[unique]
+    pairs_second = lo_first[pairs_first]
+
+    merged_first = np.zeros(len(first), dtype=bool)
+    merged_first[pairs_first] = True
+    merged_second = np.zeros(len(second), dtype=bool)
+    merged_second[pairs_second] = True
+
+    # Rows with several candidates, or one with several, are merged in turn
+    ambiguous_first = np.flatnonzero((candidates_first > 0) & ~merged_first)
+    ambiguous_second = np.flatnonzero(
+        (candidates_second > 0) & ~merged_second
+    )
+    if len(ambiguous_first) > 0 and len(ambiguous_second) > 0:
+        matched = merge_heap([
+            first[ambiguous_first],
+            second[ambiguous_second]
+        ], merge_tolerance)
+        matched = matched[(matched >= 0).all(axis=1)]
+        pairs_first = np.concatenate((
+            pairs_first, ambiguous_first[matched[:, 0]]
+        ))
+        pairs_second = np.concatenate((
+            pairs_second, ambiguous_second[matched[:, 1]]
+        ))
+        merged_first[pairs_first] = True
+        merged_second[pairs_second] = True
+
+    alone_first = np.flatnonzero(~merged_first)
+    alone_second = np.flatnonzero(~merged_second)
+    none_first = np.full(len(alone_second), -1, dtype=np.int64)
+    none_second = np.full(len(alone_first), -1, dtype=np.int64)
+
+    indices = np.column_stack((
+        np.concatenate((pairs_first, alone_first, none_first)),
+        np.concatenate((pairs_second, none_second, alone_second))
+    ))
+
+    # Merged rows come out in order of their earliest timestamp
+    times = np.concatenate((
+        np.minimum(first[pairs_first], second[pairs_second]),
+        first[alone_first],
+        second[alone_second]
+    ))
+    order = np.argsort(times, kind='mergesort')
+    if np.any(np.diff(times[order]) == 0):
+        return None
+
+    return indices[order]
+
+
+def merge_heap(timelines, merge_tolerance=1):
+    """Matches the rows of any timelines with a heap of their next rows
+
+    See merge_timelines.  Runs of rows that are not merged are found at once
+    with searchsorted when their stream is sorted.
+
+    Returns
+    -------
+    numpy.ndarray
+        Merged rows x streams array of row indices, -1 where a stream has
+        none
+    """
+
+    # Rows without a timestamp come first
+    keys = [np.where(np.isnan(times), -np.inf, times) for times in timelines]
+    ordered = [bool(np.all(np.diff(times) >= 0)) for times in timelines]
+    heads = [0] * len(timelines)
+
+    heap = [(key[0], k) for k, key in enumerate(keys) if len(key) > 0]
+    heapq.heapify(heap)
+
+    # Merged rows as (first merged row, streams, first row of each stream,
+    # number of rows)
+    runs = []
+    position = 0
+    while heap:
+        key, k = heapq.heappop(heap)
+        group = [k]
+        while heap and heap[0][0] - key <= merge_tolerance:
+            group.append(heapq.heappop(heap)[1])
+
+        start = heads[k]
+        if len(group) > 1:
+            count = 1
+        elif not heap:
+            count = len(keys[k]) - start
+        elif ordered[k]:
+            end = np.searchsorted(
+                keys[k], heap[0][0] - merge_tolerance, side='left'
+            )
+            count = max(end - start, 1)
+        else:
+            count = 1
+
+        runs.append((position, group, [heads[g] for g in group], count))
+        position += count
+        for g in group:
+            heads[g] += count
+            if heads[g] < len(keys[g]):
+                heapq.heappush(heap, (keys[g][heads[g]], g))
+
+    indices = np.full((position, len(timelines)), -1, dtype=np.int64)
+    for first, group, starts, count in runs:
+        for g, start in zip(group, starts):
+            indices[first:first + count, g] = np.arange(start, start + count)
+
+    return indices
+
+
+def merge_columns(streams, merge_tolerance=1):
+    """Merges the columns of glider data streams on their timestamps
+
+    Columnar equivalent of iterating a MergedGliderBDReader: rows are
+    matched with merge_timelines and the values of later streams replace
+    the values of earlier ones in merged rows, as science values replace
+    flight values.
+
+    Parameters
+    ----------
+    streams : list
+        Column mappings with a 'timestamp' column, as returned by
+        read_columns, in order of precedence
+    merge_tolerance : float
+        Tolerance number of seconds to consider two rows mergeable
+
+    Returns
+    -------
+    dict
+        Mapping of every key with a value in the merged rows to a float64
+        array with NaN for missing values, like rows_to_columns
+    """
+
+    indices = merge_timelines(
+        [columns['timestamp'] for columns in streams], merge_tolerance
+    )
 
-    return readings
+    merged = {}
+    for k, columns in enumerate(streams):
+        present_rows = indices[:, k] >= 0
+        rows = indices[present_rows, k]
+        for key, column in columns.items():
+            values = np.full(len(indices), np.nan)
+            values[present_rows] = np.asarray(column, dtype=np.float64)[rows]
+            if key in merged:
+                present = ~np.isnan(values)
+                merged[key][present] = values[present]
+            else:
+                merged[key] = values
+
+    return {
+        key: values for key, values in merged.items()
+        if not np.all(np.isnan(values))
+    }
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+from glob import glob
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Sensor list cache directory used when none is given
+DEFAULT_CACHE_PATH = tempfile.gettempdir()
+
+# Glider binary data files (.dbd, .sbd, .tbd, ...) indexed in a directory
+BD_FILE_PATTERNS = ('*.?bd', '*.?BD')
+
+
+def read_glider_BD_header(fp):
+    """Reads the ASCII header tags at the start of a glider binary data file
+
+    Parameters
+    ----------
+    fp : file
+        Glider binary data file opened in binary mode and positioned at the
+        start of the file
+
+    Returns
+    -------
+    dict
+        Mapping of header tag to its (string) value
+
+    Raises
+    ------
+    ValueError
+        If the file does not start with a dinkum binary data header
+    """
+    header = {}
+
+    num_ascii_tags = None
+    while num_ascii_tags is None or len(header) < num_ascii_tags:
+        line = fp.readline().decode('ascii', 'replace')
+        if not line:
+            raise ValueError('End of file found before end of header')
+
+        key, _, value = line.partition(':')
+        if not header and key != 'dbd_label':
+            raise ValueError('Not a glider binary data file')
+
+        header[key.strip()] = value.strip()
+        if key == 'num_ascii_tags':
+            num_ascii_tags = int(value)
+
+    return header
+
+
+def read_sensor_lines(fp, header):
+    return [
+        fp.readline().decode('ascii')
+        for _ in range(int(header['total_num_sensors']))
+    ]
+
+
+def get_sensor_list_cache_path(crc, cache_path):
+    return os.path.join(cache_path, '{}.cac'.format(crc.lower()))
+
+
+def write_sensor_list_cache(lines, crc, cache_path):
+    """Writes sensor list lines to a dbd2asc compatible cache file
+
+    The file is written under a unique temporary name and renamed into place
+    so readers, in this or any other process, never see a partially written
+    cache file.
+    """
+    path = get_sensor_list_cache_path(crc, cache_path)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=cache_path, prefix='.{}.'.format(crc.lower()), suffix='.tmp'
+    )
+    with os.fdopen(fd, 'wb') as f:
+        f.write(''.join(lines).encode('ascii'))
+
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Windows does not replace files, another process wrote the same list
+        os.remove(tmp_path)
+        if not os.path.isfile(path):
+            raise
+
+
+def read_sensor_list_cache(crc, cache_path):
+    path = get_sensor_list_cache_path(crc, cache_path)
+    if not os.path.isfile(path):
+        return None
+
+    with open(path, 'rb') as f:
+        return f.read().decode('ascii').splitlines(True)
+
+
+class SensorListCache(object):
+    """Directory of dbd2asc sensor list cache (.cac) files
+
+    Glider binary data files either carry their full sensor list or only its
+    CRC (a factored list), in which case the list must be cached from an
+    earlier file.  The headers of the raw files are indexed to know which
+    ones carry the full list of each CRC, so a missing list is read from a
+    single file instead of running dbd2asc over earlier segments until one
+    succeeds.
+
+    Cache files are only ever replaced atomically and dbd2asc runs over a
+    private copy of the ones it needs (see checkout), since it rewrites the
+    cache files in place.  Several processes can share the directory.
+
+    Arguments:
+    cache_path - Directory holding the .cac files, one per deployment is
+        recommended.  Created if missing.  Default: the system temporary
+        directory
+    """
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path or DEFAULT_CACHE_PATH
+        # Sensor list CRC and whether it is factored, by indexed file
+        self.crcs = {}
+        # A file carrying the full sensor list, by CRC
+        self.sources = {}
+
+        try:
+            os.makedirs(self.cache_path)
+        except OSError:
+            pass  # Already exists
+
+    def path(self, crc):
+        """Returns the path of the cache file of a sensor list CRC
+        """
+        return get_sensor_list_cache_path(crc, self.cache_path)
+
+    def read(self, crc):
+        """Returns the cached sensor list lines of a CRC or None
+        """
+        return read_sensor_list_cache(crc, self.cache_path)
+
+    def write(self, lines, crc):
+        """Caches the sensor list lines of a CRC
+        """
+        write_sensor_list_cache(lines, crc, self.cache_path)
+
+    def index(self, filePaths):
+        """Reads the headers of glider binary data files
+
+        Records the sensor list CRC of each file and which files carry a
+        full sensor list.  Files already indexed are skipped.
+
+        Returns the list of (crc, factored) of each file, None for files
+        that could not be read (yet).
+        """
+        indexed = []
+        for path in filePaths:
+            if path not in self.crcs:
+                try:
+                    with open(path, 'rb') as fp:
+                        header = read_glider_BD_header(fp)
+                    crc = header['sensor_list_crc'].lower()
+                except (IOError, OSError, ValueError, KeyError):
+                    logger.debug("Cannot index {}".format(path))
+                    indexed.append(None)
+                    continue
+
+                factored = header.get('sensor_list_factored') == '1'
+                self.crcs[path] = (crc, factored)
+                if not factored:
+                    self.sources.setdefault(crc, path)
+            indexed.append(self.crcs[path])
+
+        return indexed
+
+    def index_directory(self, directory):
+        """Indexes the glider binary data files of a directory not indexed yet
+        """
+        filePaths = set()
+        for pattern in BD_FILE_PATTERNS:
+            filePaths.update(glob(os.path.join(directory, pattern)))
+        self.index(sorted(filePaths))
+
+    def find(self, crc, path=None):
+        """Returns the sensor list lines of a CRC, caching them if missing
+
+        A missing list is read from an indexed file carrying it, indexing
+        the directory of path first when no such file is known.
+
+        Raises
+        ------
+        KeyError
+            If no file carrying the sensor list can be found.
+        """
+        lines = self.read(crc)
+        if lines is not None:
+            return lines
+
+        crc = crc.lower()
+        if crc not in self.sources and path is not None:
+            self.index_directory(os.path.dirname(os.path.abspath(path)))
+
+        source = self.sources.get(crc)
+        if source is None:
+            raise KeyError("Cannot find data file index for: %s" % path)
+
+        with open(source, 'rb') as fp:
+            lines = read_sensor_lines(fp, read_glider_BD_header(fp))
+        self.write(lines, crc)
+        logger.debug("Cached sensor list {} from {}".format(crc, source))
+        return lines
+
+    def prepare(self, filePaths):
+        """Makes sure the sensor list of every file is cached
+
+        Raises
+        ------
+        KeyError
+            If the sensor list of a file cannot be found.
+        """
+        for path, indexed in zip(filePaths, self.index(filePaths)):
+            if indexed is None:
+                continue  # Left for dbd2asc to report
+
+            crc, _ = indexed
+            if not os.path.isfile(self.path(crc)):
+                self.find(crc, path)
+
+    def checkout(self, filePaths):
+        """Creates a private cache directory for a dbd2asc run over files
+
+        Prepares the files, then copies their cache files to a new temporary
+        directory for dbd2asc to read and rewrite.  Remove it with release
+        once dbd2asc exited.
+
+        Raises
+        ------
+        KeyError
+            If the sensor list of a file cannot be found.
+        """
+        self.prepare(filePaths)
+
+        private_path = tempfile.mkdtemp(prefix='.dbd2asc.', dir=self.cache_path)
+        crcs = set(indexed[0] for indexed in self.index(filePaths) if indexed)
+        for crc in crcs:
+            shutil.copyfile(
+                self.path(crc), get_sensor_list_cache_path(crc, private_path)
+            )
+        return private_path
+
+    def release(self, private_path):
+        """Removes a private cache directory created by checkout
+        """
+        shutil.rmtree(private_path, ignore_errors=True)
+
+
+def open_sensor_list_cache(cache_path=None):
+    """Returns the SensorListCache of a directory, or cache_path itself if
+    it already is one
+    """
+    if isinstance(cache_path, SensorListCache):
+        return cache_path
+    return SensorListCache(cache_path)
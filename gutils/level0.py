@@ -4,100 +4,112 @@ from gutils.gbdr import (
     GliderBDReader,
     MergedGliderBDReader
 )
-from gutils.yo import find_yo_extrema
+from gutils.yo import find_yo_extrema, ProfileIndex
 from gutils.gps import interpolate_gps
 from gutils.yo.filters import default_filter
 
-from gutils.nc import open_glider_netcdf, GLIDER_UV_DATATYPE_KEYS
+from gutils.nc import open_glider_netcdf, clone_netcdf, GLIDER_UV_DATATYPE_KEYS
 
 
-def create_reader(flight_path, science_path):
+def create_reader(flight_path, science_path, sensors=None, cache=None,
+                  cache_path=None):
     if flight_path is not None:
         flight_reader = GliderBDReader(
-            [flight_path]
+            [flight_path],
+            sensors=sensors,
+            cache=cache,
+            cache_path=cache_path
         )
         if science_path is None:
             return flight_reader
     if science_path is not None:
         science_reader = GliderBDReader(
-            [science_path]
+            [science_path],
+            sensors=sensors,
+            cache=cache,
+            cache_path=cache_path
         )
         if flight_path is None:
             return science_reader
     return MergedGliderBDReader(flight_reader, science_reader)
 
 
-def find_profiles(flight_path, science_path, time_name, depth_name):
-    profile_values = []
-    reader = create_reader(flight_path, science_path)
-    for line in reader:
-        if depth_name in line:
-            profile_values.append([line[time_name], line[depth_name]])
+def read_frame(flight_path, science_path, sensors=None, cache=None,
+               cache_path=None):
+    """Decodes and merges a flight and science file pair exactly once
 
-    if not profile_values:
+    Returns the merged rows as aligned columns (see
+    MergedGliderBDReader.read_columns) so profiles, GPS, clock correction and
+    NetCDF output can all be derived from a single decode.
+    """
+    reader = create_reader(
+        flight_path, science_path, sensors, cache, cache_path
+    )
+    return reader.read_columns()
+
+
+def find_profiles(flight_path, science_path, time_name, depth_name, cache=None, frame=None):
+    if frame is None:
+        frame = read_frame(flight_path, science_path, cache=cache)
+
+    if depth_name not in frame:
         raise ValueError('Not enough profiles found')
 
-    try:
-        profile_values = np.array(profile_values)
-        timestamps = profile_values[:, 0]
-        depths = profile_values[:, 1]
-    except IndexError:
-        raise ValueError('Not enough timestamps or depths found')
-    else:
-        profile_dataset = find_yo_extrema(timestamps, depths)
-        return default_filter(profile_dataset)
+    has_depth = ~np.isnan(frame[depth_name])
+    if not has_depth.any():
+        raise ValueError('Not enough profiles found')
+
+    timestamps = frame[time_name][has_depth]
+    depths = frame[depth_name][has_depth]
+    profile_dataset = find_yo_extrema(timestamps, depths)
+    return default_filter(ProfileIndex.from_dataset(profile_dataset))
 
 
-def get_file_set_gps(flight_path, science_path, time_name, gps_prefix):
-    gps_values = []
-    reader = create_reader(flight_path, science_path)
+def get_file_set_gps(flight_path, science_path, time_name, gps_prefix, cache=None, frame=None):
+    if frame is None:
+        frame = read_frame(flight_path, science_path, cache=cache)
+
     lat_name = gps_prefix + 'lat-lat'
     lon_name = gps_prefix + 'lon-lon'
-    for line in reader:
-        if lat_name in line:
-            gps_values.append(
-                [line[time_name], line[lat_name], line[lon_name]]
-            )
-        else:
-            gps_values.append([line[time_name], np.nan, np.nan])
-
-    if not gps_values:
+
+    if time_name not in frame or not len(frame[time_name]):
         raise ValueError('Not enough gps posistions found')
-    try:
-        gps_values = np.array(gps_values)
-        timestamps = gps_values[:, 0]
-        latitudes = gps_values[:, 1]
-        longitudes = gps_values[:, 2]
-    except IndexError:
-        raise ValueError('Not enough timestamps, latitudes, or longitudes found')
-    else:
-        gps_values[:, 1], gps_values[:, 2] = interpolate_gps(
-            timestamps, latitudes, longitudes
-        )
+
+    timestamps = frame[time_name]
+    missing = np.full(len(timestamps), np.nan)
+    latitudes = frame.get(lat_name, missing)
+    longitudes = np.where(
+        np.isnan(latitudes), np.nan, frame.get(lon_name, missing)
+    )
+
+    gps_values = np.column_stack((timestamps, latitudes, longitudes))
+    gps_values[:, 1], gps_values[:, 2] = interpolate_gps(
+        gps_values[:, 0], gps_values[:, 1], gps_values[:, 2]
+    )
 
     return gps_values
 
 
-def get_file_set_timestamps(flight_path, science_path, flight_time_name, science_time_name, clothesline_lag_name=None):
-    flight_times = []
-    corrected_flight_science_times = []
-    science_times = []
-
-    reader = create_reader(flight_path, science_path)
-    for line in reader:
-        if flight_time_name in line and science_time_name in line and (clothesline_lag_name in line or clothesline_lag_name is None):
-            flight_times.append(line[flight_time_name])
-            if clothesline_lag_name is not None:
-                corrected_flight_science_times.append(line[science_time_name] + line[clothesline_lag_name])
-            else:
-                corrected_flight_science_times.append(line[science_time_name])
-        elif science_time_name in line:
-            science_times.append(line[science_time_name])
-        else:
-            raise Exception("Line doesn't match any time names: %s" % line.keys())
+def get_file_set_timestamps(flight_path, science_path, flight_time_name, science_time_name, clothesline_lag_name=None, cache=None, frame=None):
+    if frame is None:
+        frame = read_frame(flight_path, science_path, cache=cache)
+
+    missing = np.full(len(frame.get('timestamp', [])), np.nan)
+    flight_times = frame.get(flight_time_name, missing)
+    science_times = frame.get(science_time_name, missing)
+
+    matched = ~np.isnan(flight_times) & ~np.isnan(science_times)
+    if clothesline_lag_name is not None:
+        lags = frame.get(clothesline_lag_name, missing)
+        matched &= ~np.isnan(lags)
+        corrected_flight_science_times = science_times + lags
+    else:
+        corrected_flight_science_times = science_times
+
+    # Rows without both clocks (and lag) cannot anchor the correction
     return {
-        'flight_times': flight_times,
-        'corrected_flight_science_times': corrected_flight_science_times
+        'flight_times': flight_times[matched],
+        'corrected_flight_science_times': corrected_flight_science_times[matched]
     }
 
 
@@ -106,28 +118,96 @@ def fill_gps(line, interp_gps, time_name, gps_prefix):
     lon_name = gps_prefix + 'lon-lon'
     if lat_name not in line:
         timestamp = line[time_name]
-        line[lat_name] = interp_gps[interp_gps[:, 0] == timestamp, 1][0]
-        line[lon_name] = interp_gps[interp_gps[:, 0] == timestamp, 2][0]
+        # interp_gps rows follow the (increasing) reader timestamps
+        times = interp_gps[:, 0]
+        match = np.searchsorted(times, timestamp)
+        if match == len(times) or times[match] != timestamp:
+            # Out of order timestamps, search them all
+            match = np.flatnonzero(times == timestamp)[0]
+        line[lat_name] = interp_gps[match, 1]
+        line[lon_name] = interp_gps[match, 2]
 
     return line
 
 
-def fill_timestamp(line, interp_time, sci_time_name):
-    flight = interp_time['flight_times']
-    flight_sci = interp_time['corrected_flight_science_times']
+def fill_gps_columns(frame, interp_gps, gps_prefix):
+    """Fills the missing positions of a frame with interpolated ones
+
+    The interp_gps rows must be aligned with the frame rows, as returned by
+    get_file_set_gps for the same frame, so the whole frame is filled in a
+    single pass instead of searching interp_gps for every row.
+    """
+    lat_name = gps_prefix + 'lat-lat'
+    lon_name = gps_prefix + 'lon-lon'
+
+    missing = np.full(len(interp_gps), np.nan)
+    latitudes = frame.get(lat_name, missing).copy()
+    longitudes = frame.get(lon_name, missing).copy()
+
+    fill = np.isnan(latitudes)
+    latitudes[fill] = interp_gps[fill, 1]
+    longitudes[fill] = interp_gps[fill, 2]
 
+    frame[lat_name] = latitudes
+    frame[lon_name] = longitudes
+    return frame
+
+
+def correct_science_times(science_times, flight_times, corrected_times):
+    """Maps science clock times onto the flight clock in one vectorized call
+
+    Parameters
+    ----------
+    science_times : array_like
+        Science computer timestamps to correct (NaN where missing)
+    flight_times : array_like
+        Flight computer timestamps of the rows where both clocks are known
+    corrected_times : array_like
+        Science timestamps (plus clothesline lag) of those same rows
+
+    Returns
+    -------
+    numpy.ndarray
+        Corrected timestamps, NaN where the science time is missing
+    """
+    science_times = np.asarray(science_times, dtype=np.float64)
+    if not len(corrected_times):
+        return np.full(science_times.shape, np.nan)
+
+    corrected = np.interp(science_times, corrected_times, flight_times)
+    corrected[np.isnan(science_times)] = np.nan
+    return corrected
+
+
+def fill_timestamp(line, interp_time, sci_time_name):
     if sci_time_name in line:
-        line['i_timestamp'] = np.interp(
-            line[sci_time_name],
-            flight_sci,
-            flight
-        )
+        line['i_timestamp'] = float(correct_science_times(
+            [line[sci_time_name]],
+            interp_time['flight_times'],
+            interp_time['corrected_flight_science_times']
+        )[0])
     else:
         raise ValueError("%s not found in line. Can't interp time" % sci_time_name)
 
     return line
 
 
+def fill_timestamp_columns(frame, interp_time, sci_time_name):
+    """Adds the corrected 'i_timestamp' column of every frame row at once
+
+    Rows without a science time are left without one.
+    """
+    if sci_time_name not in frame:
+        raise ValueError("%s not found in frame. Can't interp time" % sci_time_name)
+
+    frame['i_timestamp'] = correct_science_times(
+        frame[sci_time_name],
+        interp_time['flight_times'],
+        interp_time['corrected_flight_science_times']
+    )
+    return frame
+
+
 def fill_uv_variables(dst_glider_nc, uv_values):
     for key, value in uv_values.items():
         dst_glider_nc.set_scalar(key, value)
@@ -145,22 +225,58 @@ def backfill_uv_variables(src_glider_nc, empty_uv_processed_paths):
     return uv_values
 
 
-def init_netcdf(file_path, attrs, segment_id, profile_id):
-    with open_glider_netcdf(file_path, 'w') as glider_nc:
-        # Set global attributes
-        glider_nc.set_global_attributes(attrs['global'])
+def set_deployment_attributes(glider_nc, attrs):
+    # Set global attributes
+    glider_nc.set_global_attributes(attrs['global'])
 
-        # Set Trajectory
-        glider_nc.set_trajectory_id(
-            attrs['deployment']['glider'],
-            attrs['deployment']['trajectory_date']
-        )
+    # Set Trajectory
+    glider_nc.set_trajectory_id(
+        attrs['deployment']['glider'],
+        attrs['deployment']['trajectory_date']
+    )
+
+    # Set Platform
+    glider_nc.set_platform(attrs['deployment']['platform'])
+
+    # Set Instruments
+    glider_nc.set_instruments(attrs['instruments'])
 
-        # Set Platform
-        glider_nc.set_platform(attrs['deployment']['platform'])
 
-        # Set Instruments
-        glider_nc.set_instruments(attrs['instruments'])
+def init_template(template_path, attrs, include_time=True, storage=None):
+    """Creates the file every profile file of a deployment is cloned from
+
+    Holds the deployment attributes and the variables of all known
+    datatypes, everything but the ids and the data of a profile.  Without
+    include_time the time dimension and its variables are left out, so the
+    clones can size the dimension to their own profile (see init_netcdf).
+    """
+    with open_glider_netcdf(template_path, 'w', storage=storage) as glider_nc:
+        set_deployment_attributes(glider_nc, attrs)
+
+        datatype_keys = None
+        if not include_time:
+            datatype_keys = [
+                key for key, desc in glider_nc.datatypes.items()
+                if desc.get('dimension') != 'time'
+            ]
+        glider_nc.set_datatypes(datatype_keys)
+
+
+def init_netcdf(file_path, attrs, segment_id, profile_id, template_path=None,
+                time_length=None, storage=None):
+    if template_path is not None:
+        clone_netcdf(template_path, file_path)
+        mode = 'a'
+    else:
+        mode = 'w'
+
+    with open_glider_netcdf(file_path, mode, time_length=time_length,
+                            storage=storage) as glider_nc:
+        if template_path is None:
+            set_deployment_attributes(glider_nc, attrs)
+        elif time_length:
+            # Fixed length time variables missing from the template
+            glider_nc.set_datatypes()
 
         # Set Segment ID
         glider_nc.set_segment_id(segment_id)
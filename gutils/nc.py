@@ -17,7 +17,12 @@
 import os
 import sys
 import json
+import shutil
 from datetime import datetime
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping  # Python 2
 
 import numpy as np
 from netCDF4 import Dataset, stringtoarr
@@ -42,6 +47,25 @@ GLIDER_QC = {
     "missing_value": 9
 }
 
+# Rows stream_dict_insert collects before writing them as one slab
+DEFAULT_BUFFER_ROWS = 1024
+
+# Storage of variables over a dimension.  Overridden by the storage option
+# of a writer and then by the 'storage' of each datatype in datatypes.json.
+#   zlib       - Compress the variable
+#   complevel  - Compression level, None for the COMP_LEVEL of the writer
+#   shuffle    - Apply the HDF5 shuffle filter before compressing
+#   chunksizes - Chunk shape, None for a single chunk over a fixed time
+#                dimension and the library default otherwise
+#   contiguous - Store uncompressed in one block (fixed dimensions only)
+DEFAULT_STORAGE = {
+    'zlib': True,
+    'complevel': None,
+    'shuffle': True,
+    'chunksizes': None,
+    'contiguous': False
+}
+
 GLIDER_UV_DATATYPE_KEYS = (
     'time_uv',
     'm_water_vx-m/s',
@@ -51,13 +75,104 @@ GLIDER_UV_DATATYPE_KEYS = (
 )
 
 
+class ImmutableDict(Mapping):
+    """Read only mapping used for datatypes shared between writers
+
+    Nested dictionaries are frozen too and lists become tuples.  Copy it
+    with dict() to derive a modified version.
+    """
+
+    def __init__(self, contents):
+        self.__contents = {
+            key: freeze(value) for key, value in contents.items()
+        }
+
+    def __getitem__(self, key):
+        return self.__contents[key]
+
+    def __iter__(self):
+        return iter(self.__contents)
+
+    def __len__(self):
+        return len(self.__contents)
+
+    def __repr__(self):
+        return 'ImmutableDict({!r})'.format(self.__contents)
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return ImmutableDict(value)
+    elif isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+# Parsed datatypes.json files by path: (mtime, ImmutableDict)
+DATATYPES_CACHE = {}
+
+
+def load_datatypes(config_path=None):
+    """Loads the datatypes.json mapping of reader keys to NetCDF variables
+
+    Falls back to the included datatypes.json if config_path has none.
+    Parsed files are cached for the whole process until they are modified,
+    so the returned ImmutableDict is shared and must not be changed.
+    """
+    config_path = config_path or DEFAULT_GLIDER_BASE
+    datatypes_path = os.path.join(
+        config_path,
+        'datatypes.json'
+    )
+    if not os.path.isfile(datatypes_path):
+        # Fall back to the included datatypes.json
+        datatypes_path = os.path.join(
+            DEFAULT_GLIDER_BASE,
+            'datatypes.json'
+        )
+    datatypes_path = os.path.abspath(datatypes_path)
+
+    mtime = os.path.getmtime(datatypes_path)
+    cached = DATATYPES_CACHE.get(datatypes_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(datatypes_path, 'r') as f:
+        contents = f.read()
+    datatypes = ImmutableDict(json.loads(contents))
+
+    DATATYPES_CACHE[datatypes_path] = (mtime, datatypes)
+    return datatypes
+
+
+def datatype_sensors(config_path=None):
+    """Returns the reader keys mapped by datatypes.json
+
+    Useful as a sensor whitelist for glider binary data readers.
+    """
+    return set(load_datatypes(config_path).keys())
+
+
 def open_glider_netcdf(output_path, mode=None, COMP_LEVEL=None,
-                       config_path=None, DEBUG=False):
+                       config_path=None, DEBUG=False, buffer_rows=None,
+                       time_length=None, storage=None, diskless=False):
 
     mode = mode or 'w'
     COMP_LEVEL = COMP_LEVEL or 1
     config_path = config_path or DEFAULT_GLIDER_BASE
-    return GliderNetCDFWriter(output_path, mode, COMP_LEVEL, config_path, DEBUG)
+    return GliderNetCDFWriter(
+        output_path, mode, COMP_LEVEL, config_path, DEBUG, buffer_rows,
+        time_length, storage, diskless
+    )
+
+
+def clone_netcdf(template_path, output_path):
+    """Creates a NetCDF file as a copy of a template file
+
+    Copying the file skips defining the dimensions, variables and
+    attributes again, which dominates the cost of small profile files.
+    """
+    shutil.copyfile(template_path, output_path)
 
 
 class GliderNetCDFWriter(object):
@@ -66,7 +181,8 @@ class GliderNetCDFWriter(object):
     """
 
     def __init__(self, output_path, mode=None, COMP_LEVEL=None,
-                 config_path=None, DEBUG=False):
+                 config_path=None, DEBUG=False, buffer_rows=None,
+                 time_length=None, storage=None, diskless=False):
         """Initializes a Glider NetCDF Writer
         NOTE: Does not open the file.
 
@@ -76,6 +192,20 @@ class GliderNetCDFWriter(object):
                 'a' to append to an existing NetCDF file.
                 Default: 'w'
         - COMP_LEVEL: NetCDF compression level.
+        - buffer_rows: Number of rows stream_dict_insert collects in memory
+                before writing them at once.  0 writes every row
+                immediately.  Default: DEFAULT_BUFFER_ROWS
+        - time_length: Fixed length of the time dimension when this writer
+                creates it, for files whose row count is known up front.
+                Its variables are then stored in a single chunk.
+                Default: unlimited
+        - storage: Storage policy of the variables over a dimension,
+                updating DEFAULT_STORAGE.  A 'storage' in datatypes.json
+                takes precedence for its variable.  Scalars and the
+                trajectory string are always stored uncompressed.
+        - diskless: Assemble a new file in memory and write it once when
+                closed, atomically replacing output_path.  Only for
+                mode 'w'.  Default: False
         """
 
         self.nc = None
@@ -85,6 +215,16 @@ class GliderNetCDFWriter(object):
         self.config_path = config_path or DEFAULT_GLIDER_BASE
         self.DEBUG = DEBUG
         self.datatypes = {}
+        self.qaqc_methods = {}
+        if buffer_rows is None:
+            buffer_rows = DEFAULT_BUFFER_ROWS
+        self.buffer_rows = buffer_rows
+        self.time_length = time_length
+        self.storage = storage or {}
+
+        if diskless and self.mode != 'w':
+            raise ValueError('Only new files can be assembled in memory')
+        self.diskless = diskless
 
     def __setup_qaqc(self):
         """ Internal function for qaqc variable setup
@@ -95,8 +235,6 @@ class GliderNetCDFWriter(object):
         # Meanings of QC_FLAGS
         self.QC_FLAG_MEANINGS = "no_qc_performed good_data probably_good_data bad_data_that_are_potentially_correctable bad_data value_changed not_used not_used interpolated_value missing_value"  # NOQA
 
-        self.qaqc_methods = {}
-
     def __load_datatypes(self, datatypes=None):
         """ Internal function to setup known datatypes
 
@@ -104,26 +242,17 @@ class GliderNetCDFWriter(object):
         """
 
         if datatypes is None:
-            datatypes_path = os.path.join(
-                self.config_path,
-                'datatypes.json'
-            )
-            if not os.path.isfile(datatypes_path):
-                # Fall back to the included datatypes.json
-                datatypes_path = os.path.join(
-                    DEFAULT_GLIDER_BASE,
-                    'datatypes.json'
-                )
-
-            with open(datatypes_path, 'r') as f:
-                contents = f.read()
-            self.datatypes = json.loads(contents)
+            self.datatypes = load_datatypes(self.config_path)
         else:
             self.datatypes = datatypes
 
     def append_datatypes(self, datatypes):
+        # Copy instead of changing the shared datatypes.json schema
+        appended = dict(self.datatypes)
         for key in datatypes:
-            self.datatypes[key] = datatypes[key]
+            appended[key] = datatypes[key]
+        self.datatypes = appended
+        self.__stream_plan = {}
 
     def __update_history(self):
         """ Updates the history, date_created, date_modified
@@ -147,25 +276,99 @@ class GliderNetCDFWriter(object):
         self.nc.setncattr("date_issued", time_string)
 
     def __get_time_len(self):
-        if 'time' in self.nc.variables:
-            return len(self.nc.variables['time'])
-        else:
+        self.flush()
+        if 'time' not in self.nc.variables:
             return 0
 
+        time = self.nc.variables['time']
+        if self.nc.dimensions['time'].isunlimited():
+            return len(time)
+        # Rows written so far, a fixed dimension is filled from the start
+        return int(np.ma.count(time[:]))
+
+    def __storage_options(self, dimension, storage=None):
+        """Returns the createVariable storage arguments of a variable
+
+        Input:
+        - dimension: Dimension names of the variable.
+        - storage: Storage policy of its datatype, if any.
+        """
+        if not dimension:
+            # Nothing to gain from compressing a scalar
+            return {'zlib': False}
+
+        policy = dict(DEFAULT_STORAGE)
+        policy.update(self.storage)
+        policy.update(storage or {})
+
+        lengths = []
+        for name in dimension:
+            nc_dimension = self.nc.dimensions[name]
+            lengths.append(
+                None if nc_dimension.isunlimited() else len(nc_dimension)
+            )
+        fixed = None not in lengths and 0 not in lengths
+
+        if policy['contiguous'] and fixed:
+            return {'zlib': False, 'contiguous': True}
+
+        if policy['chunksizes'] is not None:
+            # A chunk cannot be larger than a fixed dimension
+            chunksizes = tuple(
+                chunk if length is None else min(chunk, length)
+                for chunk, length in zip(policy['chunksizes'], lengths)
+            )
+        elif dimension == ('time',) and fixed:
+            # The whole profile in a single chunk
+            chunksizes = tuple(lengths)
+        else:
+            chunksizes = None
+
+        complevel = policy['complevel']
+        if complevel is None:
+            complevel = self.COMP_LEVEL
+
+        return {
+            'zlib': bool(policy['zlib']) and complevel > 0,
+            'complevel': complevel,
+            'shuffle': policy['shuffle'],
+            'chunksizes': chunksizes
+        }
+
     def __enter__(self):
         """ Opens the NetCDF file. Sets up QAQC and time variables.
         Updates global history variables.
         Called at beginning of Python with block.
         """
 
-        self.nc = Dataset(
-            self.output_path, self.mode,
-            format='NETCDF4_CLASSIC'
-        )
+        if self.diskless:
+            # Written next to output_path on close, then renamed over it
+            self.__persist_path = os.path.join(
+                os.path.dirname(os.path.abspath(self.output_path)),
+                '.{}.{}.tmp'.format(
+                    os.path.basename(self.output_path), os.getpid()
+                )
+            )
+            self.nc = Dataset(
+                self.__persist_path, self.mode,
+                format='NETCDF4_CLASSIC',
+                diskless=True,
+                persist=True
+            )
+        else:
+            self.nc = Dataset(
+                self.output_path, self.mode,
+                format='NETCDF4_CLASSIC'
+            )
 
         self.__setup_qaqc()
         self.__load_datatypes()
 
+        self.__stream_plan = {}
+        self.__buffer = {}
+        self.__buffer_start = 0
+        self.__buffer_count = 0
+
         self.__update_history()
         self.stream_index = self.__get_time_len()
 
@@ -175,12 +378,36 @@ class GliderNetCDFWriter(object):
         """ Updates bounds and closes file.  Called at end of "with" block
         """
 
+        self.close(discard=type is not None)
+
+    def open(self):
+        """ Opens the NetCDF file outside of a "with" block
+        """
+        return self.__enter__()
+
+    def close(self, discard=False):
+        """ Updates bounds and closes the NetCDF file
+
+        Input:
+        - discard: Drop a file assembled in memory instead of writing it.
+        """
+
+        if discard and self.diskless:
+            # Closing persists the file, output_path is left untouched
+            self.nc.close()
+            os.remove(self.__persist_path)
+            self.nc = None
+            return
+
         if self.__get_time_len() > 0:
             self.update_bounds()
 
         self.nc.close()
         self.nc = None
 
+        if self.diskless:
+            os.rename(self.__persist_path, self.output_path)
+
     def set_global_attributes(self, global_attributes):
         """ Sets a dictionary of values as global attributes
 
@@ -233,8 +460,7 @@ class GliderNetCDFWriter(object):
                 'trajectory',
                 'S1',
                 ('traj_strlen',),
-                zlib=True,
-                complevel=self.COMP_LEVEL
+                zlib=False
             )
 
             attrs = {
@@ -266,6 +492,24 @@ class GliderNetCDFWriter(object):
 
         return datatype
 
+    def set_datatypes(self, datatype_keys=None):
+        """ Creates the variables of a set of datatypes up front
+
+        Input:
+        - datatype_keys: Keys of the datatypes to create.
+                         Default: all known datatypes
+        """
+
+        if datatype_keys is None:
+            datatype_keys = self.datatypes.keys()
+
+        # Dimensions first, the other variables are defined over them
+        for key in sorted(
+            datatype_keys,
+            key=lambda k: not self.datatypes[k].get('is_dimension', False)
+        ):
+            self.check_datatype_exists(key)
+
     def get_status_flag_name(self, name):
         return name + "_qc"
 
@@ -274,7 +518,10 @@ class GliderNetCDFWriter(object):
         """
 
         if 'is_dimension' in desc and desc['is_dimension']:
-            self.nc.createDimension(desc['name'], desc['dimension_length'])
+            length = desc['dimension_length']
+            if desc['name'] == 'time' and self.time_length:
+                length = self.time_length
+            self.nc.createDimension(desc['name'], length)
 
         if len(desc) == 0:
             return  # Skip empty configurations
@@ -287,13 +534,14 @@ class GliderNetCDFWriter(object):
         else:
             dimension = (desc['dimension'],)
 
+        storage = self.__storage_options(dimension, desc.get('storage'))
+
         datatype = self.nc.createVariable(
             desc['name'],
             desc['type'],
             dimensions=dimension,
-            zlib=True,
-            complevel=self.COMP_LEVEL,
-            fill_value=NC_FILL_VALUES[desc['type']]
+            fill_value=NC_FILL_VALUES[desc['type']],
+            **storage
         )
 
         for k, v in sorted(desc['attrs'].items()):
@@ -307,31 +555,66 @@ class GliderNetCDFWriter(object):
                 status_flag_name,
                 'i1',
                 dimension,
-                zlib=True,
-                complevel=self.COMP_LEVEL,
-                fill_value=NC_FILL_VALUES['i1']
+                fill_value=NC_FILL_VALUES['i1'],
+                **storage
             )
             # Append defaults
             sf_standard_name = desc['attrs']['standard_name'] + ' status_flag'
-            status_flag['attrs'].update({
+            status_flag_attrs = dict(status_flag['attrs'])
+            status_flag_attrs.update({
                 'standard_name': sf_standard_name,
                 'flag_meanings': self.QC_FLAG_MEANINGS,
                 'valid_min': self.QC_FLAGS[0],
                 'valid_max': self.QC_FLAGS[-1],
                 'flag_values': self.QC_FLAGS
             })
-            for key, value in sorted(status_flag['attrs'].items()):
+            for key, value in sorted(status_flag_attrs.items()):
                 status_flag_var.setncattr(key, value)
 
+    def add_qaqc_method(self, key, method):
+        """ Registers a vectorized QAQC check for a datatype
+
+        Input:
+        - key: <value name>-<units> datatype key to check.
+        - method: Function taking an array of values and returning an
+                  array of GLIDER_QC flags of the same shape.  Missing
+                  values are flagged before the method is called.
+        """
+        self.qaqc_methods[key] = method
+
     def perform_qaqc(self, key, value):
+        """ Returns the QC flag of a value or the flags of an array of values
+
+        Masked, NaN and fill values are flagged as missing.  Other values
+        are flagged by the method registered for the key, if any.
+        """
+        if key not in self.qaqc_methods and np.isscalar(value):
+            # Fast path for streamed values
+            if value == NC_FILL_VALUES['f8'] or value != value:
+                return GLIDER_QC['missing_value']
+            return GLIDER_QC['no_qc_performed']
+
+        values = np.ma.getdata(value)
+        missing = (
+            np.ma.getmaskarray(value) |
+            (values == NC_FILL_VALUES['f8']) |
+            np.isnan(values)
+        )
+
         if key in self.qaqc_methods:
-            flag = self.qaqc_methods[key](value)
-        elif value == NC_FILL_VALUES['f8']:
-            flag = GLIDER_QC["missing_value"]
+            flags = np.array(
+                np.broadcast_to(self.qaqc_methods[key](values), missing.shape),
+                dtype='i1'
+            )
         else:
-            flag = GLIDER_QC['no_qc_performed']
+            flags = np.full(
+                missing.shape, GLIDER_QC['no_qc_performed'], dtype='i1'
+            )
+        flags[missing] = GLIDER_QC['missing_value']
 
-        return flag
+        if flags.ndim == 0:
+            return int(flags)
+        return flags
 
     def set_scalar(self, key, value=None):
         datatype = self.check_datatype_exists(key)
@@ -347,6 +630,7 @@ class GliderNetCDFWriter(object):
             self.nc.variables[status_flag_name].assignValue(flag)
 
     def set_array_value(self, key, index, value=None):
+        self.flush()
         datatype = self.check_datatype_exists(key)
         if value is None:
             value = NC_FILL_VALUES[datatype['type']]
@@ -359,14 +643,15 @@ class GliderNetCDFWriter(object):
             self.nc.variables[status_flag_name][index] = flag
 
     def set_array(self, key, values):
+        self.flush()
         datatype = self.check_datatype_exists(key)
         
         self.nc.variables[datatype['name']][:] = values
         if "status_flag" in datatype:
             status_flag_name = self.get_status_flag_name(datatype['name'])
-            for i, value in enumerate(values):
-                flag = self.perform_qaqc(key, value)
-                self.nc.variables[status_flag_name][i] = flag
+            self.nc.variables[status_flag_name][:] = (
+                self.perform_qaqc(key, values)
+            )
 
     def set_segment_id(self, segment_id):
         """ Sets the segment ID as a variable
@@ -425,9 +710,41 @@ class GliderNetCDFWriter(object):
         self.set_scalar('lat_uv', line['m_gps_lat-lat'])
         self.set_scalar('lon_uv', line['m_gps_lon-lon'])
 
+    def __plan_key(self, key):
+        """ Compiles how the values of a reader key are inserted
+
+        Returns None for keys without a datatype, otherwise a tuple of
+        (is time dimensioned, variable, status flag variable or None,
+        fill value).
+        Creates the variables, so only called once a value is available.
+        """
+
+        if key not in self.datatypes:
+            if self.DEBUG:
+                logger.debug("Datatype {} does not exist".format(key))
+            return None
+
+        datatype = self.check_datatype_exists(key)
+        variable = self.nc.variables[datatype['name']]
+        status_flag_variable = None
+        if "status_flag" in datatype:
+            status_flag_variable = self.nc.variables[
+                self.get_status_flag_name(datatype['name'])
+            ]
+
+        return (
+            datatype['dimension'] == 'time',
+            variable,
+            status_flag_variable,
+            NC_FILL_VALUES[datatype['type']]
+        )
+
     def stream_dict_insert(self, line, qaqc_methods={}):
         """ Adds a data point glider_binary_data_reader library to NetCDF
 
+        Each reader key is looked up in the datatypes once per file and
+        routed through the resulting plan afterwards.
+
         Input:
         - line: A dictionary of values where the key is a given
                 <value name>-<units> pair that matches a description
@@ -437,12 +754,143 @@ class GliderNetCDFWriter(object):
         if 'timestamp' not in line:
             raise ValueError('No timestamp found for line')
 
-        self.set_array_value('timestamp', self.stream_index, line['timestamp'])
+        plan = self.__stream_plan
+        index = self.stream_index
+        buffered = self.buffer_rows > 0
+        if buffered:
+            if self.__buffer_count == 0:
+                self.__buffer_start = index
+            self.__buffer_value('timestamp', line['timestamp'])
+        else:
+            self.set_array_value('timestamp', index, line['timestamp'])
 
         for name, value in line.items():
             if name == 'timestamp':
                 continue  # Skip timestamp, inserted above
 
+            if name in plan:
+                entry = plan[name]
+            else:
+                entry = plan[name] = self.__plan_key(name)
+
+            if entry is None:
+                continue
+
+            is_time, variable, status_flag_variable, fill_value = entry
+            if value is None:
+                value = fill_value
+
+            if is_time:
+                if buffered:
+                    self.__buffer_value(name, value)
+                    continue
+
+                variable[index] = value
+                if status_flag_variable is not None:
+                    status_flag_variable[index] = self.perform_qaqc(name, value)
+            else:
+                variable.assignValue(value)
+                if status_flag_variable is not None:
+                    status_flag_variable.assignValue(
+                        self.perform_qaqc(name, value)
+                    )
+                if name == "m_water_vx-m/s":
+                    self.fill_uv_vars(line)
+
+        self.stream_index += 1
+
+        if buffered:
+            self.__buffer_count += 1
+            if self.__buffer_count >= self.buffer_rows:
+                self.flush()
+
+    def __buffer_value(self, key, value):
+        if key not in self.__buffer:
+            # Creates the variable (and time dimension) like streaming does
+            self.check_datatype_exists(key)
+            self.__buffer[key] = (
+                np.empty(self.buffer_rows),
+                np.zeros(self.buffer_rows, dtype=bool)
+            )
+
+        values, present = self.__buffer[key]
+        values[self.__buffer_count] = value
+        present[self.__buffer_count] = True
+
+    def flush(self):
+        """ Writes the rows collected by stream_dict_insert to the file
+
+        Called when the buffer is full, before anything reads or writes the
+        time dimensioned variables directly and when the file is closed.
+        """
+
+        count = self.__buffer_count
+        if count == 0:
+            return
+
+        # Timestamp first, it extends the time dimension
+        for key in sorted(self.__buffer, key=lambda k: k != 'timestamp'):
+            values, present = self.__buffer[key]
+            self.__write_array(
+                key,
+                self.__buffer_start,
+                values[:count],
+                ~present[:count]
+            )
+
+        self.__buffer = {}
+        self.__buffer_count = 0
+
+    def __write_array(self, key, start, values, missing=None):
+        datatype = self.check_datatype_exists(key)
+        if missing is None:
+            missing = np.isnan(values)
+        end = start + len(values)
+
+        self.nc.variables[datatype['name']][start:end] = (
+            np.ma.masked_array(values, mask=missing)
+        )
+
+        if "status_flag" in datatype:
+            status_flag_name = self.get_status_flag_name(datatype['name'])
+            self.nc.variables[status_flag_name][start:end] = (
+                np.ma.masked_array(
+                    self.perform_qaqc(key, values),
+                    mask=missing
+                )
+            )
+
+    def write_profile(self, columns):
+        """ Adds a set of glider data rows to NetCDF in bulk
+
+        Equivalent to calling stream_dict_insert for each row, but every
+        variable is created once and written, along with its status flags,
+        in a single array assignment.
+
+        Input:
+        - columns: A dictionary of equal length arrays where the key is a
+                given <value name>-<units> pair that matches a description
+                in the datatypes.json file.  NaN marks missing values.
+        """
+
+        if 'timestamp' not in columns or np.isnan(columns['timestamp']).any():
+            raise ValueError('No timestamp found for line')
+
+        self.flush()
+        start = self.stream_index
+        if len(columns['timestamp']) == 0:
+            return
+
+        self.__write_array('timestamp', start, columns['timestamp'])
+
+        for name, values in columns.items():
+            if name == 'timestamp':
+                continue  # Skip timestamp, inserted above
+
+            present = ~np.isnan(values)
+            if not present.any():
+                continue
+
             try:
                 datatype = self.check_datatype_exists(name)
             except KeyError:
@@ -450,23 +898,40 @@ class GliderNetCDFWriter(object):
                     logger.exception("Datatype {} does not exist".format(name))
                 continue
 
-            datatype = self.datatypes[name]
             if datatype['dimension'] == 'time':
-                self.set_array_value(name, self.stream_index, value)
+                self.__write_array(name, start, values)
             else:
-                self.set_scalar(name, value)
+                # Scalars keep the last value, as when streaming rows
+                last = np.flatnonzero(present)[-1]
+                self.set_scalar(name, values[last])
                 if name == "m_water_vx-m/s":
-                    self.fill_uv_vars(line)
+                    self.fill_uv_vars({
+                        key: column[last] for key, column in columns.items()
+                        if not np.isnan(column[last])
+                    })
 
-        self.stream_index += 1
+        self.stream_index = start + len(columns['timestamp'])
 
     def contains(self, datatype_key):
+        self.flush()
         if datatype_key in self.datatypes:
             field_name = self.datatypes[datatype_key]['name']
             return field_name in self.nc.variables
         else:
             return False
 
+    def has_scalar(self, datatype_key):
+        """ Whether a scalar variable exists and holds a value
+
+        Variables cloned from a template exist before any value is set.
+        """
+        value = self.get_scalar(datatype_key)
+        return (
+            value is not None and
+            value is not np.ma.masked and
+            value != NC_FILL_VALUES[self.datatypes[datatype_key]['type']]
+        )
+
     def get_scalar(self, datatype_key):
         if self.contains(datatype_key):
             field_name = self.datatypes[datatype_key]['name']
@@ -476,6 +941,7 @@ class GliderNetCDFWriter(object):
         datatype = self.check_datatype_exists(datatype_key)
         field_name = datatype['name']
 
+        src_glider_nc.flush()
         if src_glider_nc.contains(field_name):
             src_variable = src_glider_nc.nc.variables[field_name]
 
@@ -510,6 +976,7 @@ class GliderNetCDFWriter(object):
         before closing a file
         """
 
+        self.flush()
         if 'time' in self.nc.variables:
             profile_time = self.__netcdf_to_np_op(
                 self.nc.variables['time'][:],
@@ -536,6 +1003,7 @@ class GliderNetCDFWriter(object):
         before closing a file.
         """
 
+        self.flush()
         for key, desc in self.datatypes.items():
             if 'global_bound' in desc:
                 prefix = desc['global_bound']
@@ -621,3 +1089,62 @@ class GliderNetCDFWriter(object):
 
         density[np.isnan(density)] = NC_FILL_VALUES['f8']
         self.set_array('density-kg/m^3', density)
+
+
+class UVBackfill(object):
+    """Fills the depth averaged current (UV) scalars of a series of profiles
+
+    A profile without UV values takes those of the last profile that had
+    them.  Profiles before the first one with UV values are kept open until
+    a later profile provides them, then all of them are filled in one pass
+    and closed, so no written file is opened again.
+    """
+
+    def __init__(self):
+        self.uv_values = None
+        self.pending = []
+
+    def update(self, glider_nc):
+        """ Handles the UV values of an open profile writer
+
+        Call once its rows are written.  Fills the pending writers when it
+        holds UV values, otherwise fills it or keeps it pending.
+        """
+
+        if glider_nc.has_scalar('time_uv'):
+            self.uv_values = {
+                key: glider_nc.get_scalar(key)
+                for key in GLIDER_UV_DATATYPE_KEYS
+            }
+            for pending_nc in self.pending:
+                self.__fill(pending_nc)
+                if pending_nc is not glider_nc:
+                    pending_nc.close()
+            del self.pending[:]
+        elif self.uv_values is not None:
+            self.__fill(glider_nc)
+        elif glider_nc not in self.pending:
+            self.pending.append(glider_nc)
+
+    def __fill(self, glider_nc):
+        for key, value in self.uv_values.items():
+            glider_nc.set_scalar(key, value)
+
+    def close(self, glider_nc):
+        """ Closes a profile writer unless it waits for UV values
+        """
+
+        if glider_nc not in self.pending:
+            glider_nc.close()
+
+    def finish(self, discard=False):
+        """ Closes the writers still waiting, no more UV values will come
+
+        Input:
+        - discard: Drop files assembled in memory instead of writing them.
+        """
+
+        for glider_nc in self.pending:
+            if glider_nc.nc is not None:
+                glider_nc.close(discard)
+        del self.pending[:]
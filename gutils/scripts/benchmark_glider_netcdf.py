@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+# benchmark_glider_netcdf.py - Compares storage policies of the NetCDF files
+#   written by create_glider_netcdf.py.  Writes the profiles of a set of
+#   glider binary data files once per policy and reports the write time,
+#   the time to read every variable back and the total size of the files.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from collections import OrderedDict
+
+from netCDF4 import Dataset
+
+from gutils.scripts.create_glider_netcdf import (
+    process_dataset,
+    find_segment_id
+)
+
+import logging
+logger = logging.getLogger('gutils.nc')
+
+
+# Policies compared when none are given, see DEFAULT_STORAGE in gutils/nc.py
+DEFAULT_POLICIES = OrderedDict([
+    ('default', {}),
+    ('no_shuffle', {'shuffle': False}),
+    ('complevel_4', {'complevel': 4}),
+    ('complevel_9', {'complevel': 9}),
+    ('uncompressed', {'zlib': False}),
+    ('contiguous', {'contiguous': True})
+])
+
+
+def netcdf_paths(output_path):
+    paths = []
+    for root, _, files in os.walk(output_path):
+        for filename in sorted(files):
+            if filename.endswith('.nc'):
+                paths.append(os.path.join(root, filename))
+    return paths
+
+
+def read_netcdf_files(paths):
+    """Reads every variable of a set of NetCDF files
+    """
+    for path in paths:
+        with Dataset(path) as nc:
+            for variable in nc.variables.values():
+                variable[:]
+
+
+def benchmark_policy(args, storage, repeat=1):
+    """Writes and reads back the files of one storage policy
+
+    Returns the best (write seconds, read seconds) of repeat runs and the
+    total size in bytes of the files.
+    """
+    write_times = []
+    read_times = []
+    for _ in range(repeat):
+        output_path = tempfile.mkdtemp()
+        try:
+            run_args = argparse.Namespace(**vars(args))
+            run_args.output_path = output_path
+
+            started = time.time()
+            process_dataset(run_args, storage)
+            write_times.append(time.time() - started)
+
+            paths = netcdf_paths(output_path)
+            started = time.time()
+            read_netcdf_files(paths)
+            read_times.append(time.time() - started)
+
+            size = sum(os.path.getsize(path) for path in paths)
+        finally:
+            shutil.rmtree(output_path)
+
+    return min(write_times), min(read_times), size
+
+
+def benchmark(args, policies=None, repeat=1):
+    """Benchmarks a set of storage policies
+
+    Returns a list of (name, write seconds, read seconds, size in bytes).
+    """
+    policies = policies or DEFAULT_POLICIES
+
+    results = []
+    for name, storage in policies.items():
+        results.append((name,) + benchmark_policy(args, storage, repeat))
+    return results
+
+
+def create_arg_parser():
+    parser = argparse.ArgumentParser(
+        description='Compares the write time, read time and file size of '
+                    'NetCDF files written with different storage policies.'
+    )
+
+    parser.add_argument(
+        'glider_config_path',
+        help='Path to configuration files for this specific glider deployment.'
+    )
+
+    parser.add_argument(
+        '-t', '--time',
+        help="Set time parameter to use for profile recognition",
+        default="timestamp"
+    )
+
+    parser.add_argument(
+        '-d', '--depth',
+        help="Set depth parameter to use for profile recognition",
+        default="m_depth-m"
+    )
+
+    parser.add_argument(
+        '-g', '--gps_prefix',
+        help="Set prefix for gps parameters to use for location estimation",
+        default="m_gps_"
+    )
+
+    parser.add_argument(
+        '-f', '--flight',
+        help="Flight data file to process",
+        default=None
+    )
+
+    parser.add_argument(
+        '-s', '--science',
+        help="Science data file to process",
+        default=None
+    )
+
+    parser.add_argument(
+        '-p', '--policies',
+        help="JSON file mapping policy names to storage policies. "
+             "Default: a set of compression and chunking variants",
+        default=None
+    )
+
+    parser.add_argument(
+        '-r', '--repeat',
+        help="Number of runs per policy, the best one is reported",
+        type=int,
+        default=3
+    )
+
+    return parser
+
+
+def main():
+    parser = create_arg_parser()
+    args = parser.parse_args()
+
+    if args.flight is None and args.science is None:
+        raise ValueError('Must specify flight, science or both paths')
+
+    policies = None
+    if args.policies is not None:
+        with open(args.policies, 'r') as f:
+            policies = json.load(f, object_pairs_hook=OrderedDict)
+
+    repeat = args.repeat
+    del args.policies
+    del args.repeat
+    args.segment_id = find_segment_id(args.flight, args.science)
+    args.mode = 'rt'
+
+    print("%-16s %10s %10s %12s" % ('policy', 'write (s)', 'read (s)', 'size (B)'))
+    for name, write, read, size in benchmark(args, policies, repeat):
+        print("%-16s %10.3f %10.3f %12d" % (name, write, read, size))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
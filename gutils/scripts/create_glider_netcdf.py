@@ -11,9 +11,7 @@
 import os
 import sys
 import json
-import shutil
 import argparse
-import tempfile
 from datetime import datetime
 
 import numpy as np
@@ -24,27 +22,35 @@ from gutils.gbdr import (
 )
 
 
-from gutils.yo import find_yo_extrema
+from gutils.yo import find_yo_extrema, ProfileIndex
 from gutils.gps import interpolate_gps
 from gutils.yo.filters import default_filter
 from gutils.gbdr.methods import parse_glider_filename
 
-from gutils.nc import open_glider_netcdf, GLIDER_UV_DATATYPE_KEYS
+from gutils.nc import (
+    open_glider_netcdf,
+    datatype_sensors,
+    UVBackfill
+)
 
 import logging
 logger = logging.getLogger('gutils.nc')
 
 
-def create_reader(flight_path, science_path):
+def create_reader(flight_path, science_path, sensors=None, cache_path=None):
     if flight_path is not None:
         flight_reader = GliderBDReader(
-            [flight_path]
+            [flight_path],
+            sensors=sensors,
+            cache_path=cache_path
         )
         if science_path is None:
             return flight_reader
     if science_path is not None:
         science_reader = GliderBDReader(
-            [science_path]
+            [science_path],
+            sensors=sensors,
+            cache_path=cache_path
         )
         if flight_path is None:
             return science_reader
@@ -52,91 +58,195 @@ def create_reader(flight_path, science_path):
     return MergedGliderBDReader(flight_reader, science_reader)
 
 
-def find_profiles(flight_path, science_path, time_name, depth_name):
-    profile_values = []
-    reader = create_reader(flight_path, science_path)
-    for line in reader:
-        if depth_name in line:
-            profile_values.append([line[time_name], line[depth_name]])
+def read_frame(flight_path, science_path, sensors=None, cache_path=None):
+    """Decodes and merges a flight and science file pair exactly once
+
+    Returns the merged rows as aligned columns (see
+    MergedGliderBDReader.read_columns) so profiles, GPS and NetCDF output can
+    all be derived from a single decode.
+    """
+    reader = create_reader(flight_path, science_path, sensors, cache_path)
+    return reader.read_columns()
+
 
-    if not profile_values:
+def find_profiles(flight_path, science_path, time_name, depth_name,
+                  sensors=None, frame=None):
+    if frame is None:
+        frame = read_frame(flight_path, science_path, sensors)
+
+    if depth_name not in frame:
         raise ValueError('Not enough profiles found')
 
-    try:
-        profile_values = np.array(profile_values)
-        timestamps = profile_values[:, 0]
-        depths = profile_values[:, 1]
-    except IndexError:
-        raise ValueError('Not enough timestamps or depths found')
-    else:
-        profile_dataset = find_yo_extrema(timestamps, depths)
-        return default_filter(profile_dataset)
+    has_depth = ~np.isnan(frame[depth_name])
+    if not has_depth.any():
+        raise ValueError('Not enough profiles found')
+
+    timestamps = frame[time_name][has_depth]
+    depths = frame[depth_name][has_depth]
+    profile_dataset = find_yo_extrema(timestamps, depths)
+    return default_filter(ProfileIndex.from_dataset(profile_dataset))
 
 
-def get_file_set_gps(flight_path, science_path, time_name, gps_prefix):
-    gps_values = []
-    reader = create_reader(flight_path, science_path)
+def get_file_set_gps(flight_path, science_path, time_name, gps_prefix,
+                     sensors=None, frame=None):
+    if frame is None:
+        frame = read_frame(flight_path, science_path, sensors)
+
     lat_name = gps_prefix + 'lat-lat'
     lon_name = gps_prefix + 'lon-lon'
-    for line in reader:
-        if lat_name in line:
-            gps_values.append(
-                [line[time_name], line[lat_name], line[lon_name]]
-            )
-        else:
-            gps_values.append([line[time_name], np.nan, np.nan])
-
-    if not gps_values:
+
+    if time_name not in frame or not len(frame[time_name]):
         raise ValueError('Not enough gps posistions found')
 
-    try:
-        gps_values = np.array(gps_values)
-        timestamps = gps_values[:, 0]
-        latitudes = gps_values[:, 1]
-        longitudes = gps_values[:, 2]
-    except IndexError:
-        raise ValueError('Not enough timestamps, latitudes, or longitudes found')
-    else:
-        gps_values[:, 1], gps_values[:, 2] = interpolate_gps(
-            timestamps, latitudes, longitudes
-        )
+    timestamps = frame[time_name]
+    missing = np.full(len(timestamps), np.nan)
+    latitudes = frame.get(lat_name, missing)
+    longitudes = np.where(
+        np.isnan(latitudes), np.nan, frame.get(lon_name, missing)
+    )
+
+    gps_values = np.column_stack((timestamps, latitudes, longitudes))
+    gps_values[:, 1], gps_values[:, 2] = interpolate_gps(
+        gps_values[:, 0], gps_values[:, 1], gps_values[:, 2]
+    )
 
     return gps_values
 
 
-def fill_gps(line, interp_gps, time_name, gps_prefix):
+def fill_gps_columns(frame, interp_gps, gps_prefix):
+    """Fills the missing positions of a frame with interpolated ones
+
+    The interp_gps rows must be aligned with the frame rows, as returned by
+    get_file_set_gps for the same frame, so the whole frame is filled in a
+    single pass instead of searching interp_gps for every row.
+    """
     lat_name = gps_prefix + 'lat-lat'
     lon_name = gps_prefix + 'lon-lon'
-    if lat_name not in line:
-        timestamp = line[time_name]
-        line[lat_name] = interp_gps[interp_gps[:, 0] == timestamp, 1][0]
-        line[lon_name] = interp_gps[interp_gps[:, 0] == timestamp, 2][0]
 
-    return line
+    missing = np.full(len(interp_gps), np.nan)
+    latitudes = frame.get(lat_name, missing).copy()
+    longitudes = frame.get(lon_name, missing).copy()
 
+    fill = np.isnan(latitudes)
+    latitudes[fill] = interp_gps[fill, 1]
+    longitudes[fill] = interp_gps[fill, 2]
 
-def init_netcdf(file_path, attrs, segment_id, profile_id):
-    with open_glider_netcdf(file_path, 'w') as glider_nc:
-        # Set global attributes
-        glider_nc.set_global_attributes(attrs['global'])
+    frame[lat_name] = latitudes
+    frame[lon_name] = longitudes
+    return frame
 
-        # Set Trajectory
-        glider_nc.set_trajectory_id(
-            attrs['deployment']['glider'],
-            attrs['deployment']['trajectory_date']
-        )
 
-        # Set Platform
-        glider_nc.set_platform(attrs['deployment']['platform'])
+def set_deployment_attributes(glider_nc, attrs):
+    # Set global attributes
+    glider_nc.set_global_attributes(attrs['global'])
+
+    # Set Trajectory
+    glider_nc.set_trajectory_id(
+        attrs['deployment']['glider'],
+        attrs['deployment']['trajectory_date']
+    )
+
+    # Set Platform
+    glider_nc.set_platform(attrs['deployment']['platform'])
+
+    # Set Instruments
+    glider_nc.set_instruments(attrs['instruments'])
+
 
-        # Set Instruments
-        glider_nc.set_instruments(attrs['instruments'])
+def open_profile_netcdf(file_path, attrs, segment_id, profile_id,
+                        time_length=None, storage=None):
+    """Opens a new profile file assembled in memory
+
+    Holds the deployment attributes, the ids and the variables of all known
+    datatypes.  Nothing is written to file_path until the returned writer
+    is closed.
+    """
+    glider_nc = open_glider_netcdf(
+        file_path, 'w',
+        time_length=time_length,
+        storage=storage,
+        diskless=True
+    ).open()
+
+    try:
+        set_deployment_attributes(glider_nc, attrs)
+        glider_nc.set_datatypes()
 
         # Set Segment ID
         glider_nc.set_segment_id(segment_id)
 
         # Set Profile ID
         glider_nc.set_profile_id(profile_id)
+    except BaseException:
+        glider_nc.close(discard=True)
+        raise
+
+    return glider_nc
+
+
+def find_sensors(time_name, depth_name, gps_prefix):
+    """Returns the sensors needed to process a dataset
+
+    Everything mapped by datatypes.json plus the sensors used for profile
+    recognition and location estimation.
+    """
+    sensors = datatype_sensors()
+    sensors.update([
+        time_name,
+        depth_name,
+        gps_prefix + 'lat-lat',
+        gps_prefix + 'lon-lon'
+    ])
+    return sensors
+
+
+def profile_row_ranges(timestamps, profiles):
+    """Splits the rows of a frame into the ranges written per profile
+
+    A range starts a new file when its first row is past the end of the
+    previous profile.  As when streaming rows, the row past the end of a
+    profile is consumed without being written.
+
+    profiles is a ProfileIndex, or an Nx3 array of timestamps, depth and
+    profile ids.
+
+    Returns a list of (profile_id, start, end, new_file) tuples.
+    """
+    if not isinstance(profiles, ProfileIndex):
+        profiles = ProfileIndex.from_dataset(profiles)
+    profile_ends = profiles['t_end']
+
+    ranges = []
+    profile_id = 0
+    profile_end = 0
+    start = 0
+    while start < len(timestamps):
+        new_file = profile_end < timestamps[start]
+        if new_file:
+            if profile_id >= len(profile_ends):
+                raise ValueError('No profile {} found'.format(profile_id))
+            profile_end = profile_ends[profile_id]
+
+        # Rows up to the first one past the end of the profile
+        beyond = np.flatnonzero(timestamps[start:] > profile_end)
+        end = start + beyond[0] if len(beyond) else len(timestamps)
+
+        ranges.append((profile_id, start, end, new_file))
+        profile_id += 1
+        start = end + 1
+
+    return ranges
+
+
+def file_time_lengths(ranges):
+    """Returns the number of rows written to each file of a set of ranges
+    """
+    lengths = []
+    for _, start, end, new_file in ranges:
+        if new_file:
+            lengths.append(0)
+        lengths[-1] += end - start
+    return lengths
 
 
 def find_segment_id(flight_path, science_path):
@@ -149,23 +259,6 @@ def find_segment_id(flight_path, science_path):
     return details['segment']
 
 
-def fill_uv_variables(dst_glider_nc, uv_values):
-    for key, value in uv_values.items():
-        dst_glider_nc.set_scalar(key, value)
-
-
-def backfill_uv_variables(src_glider_nc, empty_uv_processed_paths):
-    uv_values = {}
-    for key_name in GLIDER_UV_DATATYPE_KEYS:
-        uv_values[key_name] = src_glider_nc.get_scalar(key_name)
-
-    for file_path in empty_uv_processed_paths:
-        with open_glider_netcdf(file_path, 'a') as dst_glider_nc:
-            fill_uv_variables(dst_glider_nc, uv_values)
-
-    return uv_values
-
-
 def create_arg_parser():
     parser = argparse.ArgumentParser(
         description='Parses a set of glider binary data files to a '
@@ -226,6 +319,20 @@ def create_arg_parser():
         default=None
     )
 
+    parser.add_argument(
+        '--storage',
+        help="JSON file with the storage policy of the output variables "
+             "(see DEFAULT_STORAGE in gutils/nc.py)",
+        default=None
+    )
+
+    parser.add_argument(
+        '-c', '--cache_path',
+        help="Directory of the dbd2asc sensor list cache (.cac) files of the "
+             "deployment (Default: the system temporary directory)",
+        default=None
+    )
+
     return parser
 
 
@@ -260,7 +367,7 @@ def read_attrs(glider_config_path):
     return attrs
 
 
-def process_dataset(args):
+def process_dataset(args, storage=None, cache_path=None):
 
     attrs = read_attrs(args.glider_config_path)
 
@@ -275,75 +382,77 @@ def process_dataset(args):
         attrs['deployment']['trajectory_date']
     )
 
+    # Only convert the sensors that end up in the NetCDF files
+    sensors = find_sensors(args.time, args.depth, args.gps_prefix)
+
     try:
+        # Decode and merge the file pair once, everything else derives
+        # from it
+        frame = read_frame(flight_path, science_path, sensors, cache_path)
+
         # Find profile breaks
-        profiles = find_profiles(flight_path, science_path, args.time, args.depth)
+        profiles = find_profiles(
+            flight_path, science_path, args.time, args.depth, frame=frame
+        )
 
         # Interpolate GPS
         interp_gps = get_file_set_gps(
-            flight_path, science_path, args.time, args.gps_prefix
+            flight_path, science_path, args.time, args.gps_prefix, frame=frame
         )
     except ValueError as e:
         logger.error('{} - Skipping'.format(e))
         return 1
 
+    fill_gps_columns(frame, interp_gps, args.gps_prefix)
+
     # Create NetCDF Files for Each Profile
-    profile_id = 0
-    profile_end = 0
-    file_path = None
-    uv_values = None
-    movepairs = []
-    empty_uv_processed_paths = []
-    reader = create_reader(flight_path, science_path)
-
-    # Tempdirectory
-    tmpdir = tempfile.mkdtemp()
-
-    for line in reader:
-        if profile_end < line[timestr]:
-            # New profile! init the NetCDF output file
-
-            # Path to hold file while we create it
-            _, tmp_path = tempfile.mkstemp(dir=tmpdir, suffix='.nc', prefix='gutils')
-
-            # Open new NetCDF
-            begin_time = datetime.utcfromtimestamp(line[timestr])
-            filename = "%s_%s_%s.nc" % (
-                glider_name,
-                begin_time.strftime("%Y%m%dT%H%M%SZ"),
-                args.mode
-            )
-
-            file_path = os.path.join(
-                args.output_path,
-                deployment_name,
-                filename
-            )
-
-            # NOTE: Store 1 based profile id
-            init_netcdf(tmp_path, attrs, args.segment_id, profile_id + 1)
-            profile = profiles[profiles[:, 2] == profile_id]
-            profile_end = max(profile[:, 0])
-
-        with open_glider_netcdf(tmp_path, 'a') as glider_nc:
-            while line[timestr] <= profile_end:
-                line = fill_gps(line, interp_gps, args.time, args.gps_prefix)
-                glider_nc.stream_dict_insert(line)
+    timestamps = frame[timestr]
+
+    # Rows of every file are known before it is created
+    ranges = profile_row_ranges(timestamps, profiles)
+    time_lengths = iter(file_time_lengths(ranges))
+
+    # Files assembled in memory, each written once when closed.  Files
+    # without UV values stay open until a later profile provides them.
+    glider_nc = None
+    uv_backfill = UVBackfill()
+
+    try:
+        for profile_id, start, end, new_file in ranges:
+            if new_file:
+                # New profile! init the NetCDF output file
+                if glider_nc is not None:
+                    uv_backfill.close(glider_nc)
+
+                begin_time = datetime.utcfromtimestamp(timestamps[start])
+                filename = "%s_%s_%s.nc" % (
+                    glider_name,
+                    begin_time.strftime("%Y%m%dT%H%M%SZ"),
+                    args.mode
+                )
+
+                file_path = os.path.join(
+                    args.output_path,
+                    deployment_name,
+                    filename
+                )
                 try:
-                    line = reader.__next__()
-                except StopIteration:
-                    break
+                    os.makedirs(os.path.dirname(file_path))
+                except OSError:
+                    pass  # destination folder exists
+
+                # NOTE: Store 1 based profile id
+                glider_nc = open_profile_netcdf(
+                    file_path, attrs, args.segment_id, profile_id + 1,
+                    next(time_lengths), storage
+                )
+
+            glider_nc.write_profile({
+                key: column[start:end] for key, column in frame.items()
+            })
 
             # Handle UV Variables
-            if glider_nc.contains('time_uv'):
-                uv_values = backfill_uv_variables(
-                    glider_nc, empty_uv_processed_paths
-                )
-            elif uv_values is not None:
-                fill_uv_variables(glider_nc, uv_values)
-                del empty_uv_processed_paths[:]
-            else:
-                empty_uv_processed_paths.append(tmp_path)
+            uv_backfill.update(glider_nc)
 
             glider_nc.update_profile_vars()
             try:
@@ -352,18 +461,18 @@ def process_dataset(args):
             except BaseException as e:
                 logger.error(e)
             glider_nc.update_bounds()
+    except BaseException:
+        # Leave no partially written files behind
+        uv_backfill.finish(discard=True)
+        if glider_nc is not None and glider_nc.nc is not None:
+            glider_nc.close(discard=True)
+        raise
 
-        movepairs.append((tmp_path, file_path))
-
-        profile_id += 1
+    if glider_nc is not None:
+        uv_backfill.close(glider_nc)
 
-    for tp, fp in movepairs:
-        try:
-            os.makedirs(os.path.dirname(fp))
-        except OSError:
-            pass  # destination folder exists
-        shutil.move(tp, fp)
-    shutil.rmtree(tmpdir)
+    # No UV values after these, written as they are
+    uv_backfill.finish()
 
     return 0
 
@@ -386,7 +495,12 @@ def main():
     if args.segment_id is None:
         args.segment_id = find_segment_id(args.flight, args.science)
 
-    return process_dataset(args)
+    storage = None
+    if args.storage is not None:
+        with open(args.storage, 'r') as f:
+            storage = json.load(f)
+
+    return process_dataset(args, storage, args.cache_path)
 
 
 if __name__ == '__main__':
@@ -106,3 +106,313 @@ def find_yo_extrema(timestamps, depth):
         profiled_dataset[start_index:, 2] = len(interp_indices) - 1
 
     return profiled_dataset
+
+
+class ProfileIndex(object):
+    """Compact index of the profiles found in a time/depth series
+
+    Holds one record per profile instead of a profile id per row:
+
+    * start, end - First and past the last row of the profile
+    * t_start, t_end - Time bounds of the profile
+    * depth_min, depth_max - Depth bounds of the profile
+    * direction - 1 for a dive, -1 for a climb, 0 when the depth did not
+      change from the first to the last row
+
+    Index it with a profile id for its record or with a field name for the
+    field of every profile.  Profiles must follow each other in time.
+    """
+
+    dtype = np.dtype([
+        ('start', 'i8'),
+        ('end', 'i8'),
+        ('t_start', 'f8'),
+        ('t_end', 'f8'),
+        ('depth_min', 'f8'),
+        ('depth_max', 'f8'),
+        ('direction', 'i1')
+    ])
+
+    def __init__(self, timestamps, depths, starts, ends):
+        """Builds the index of the profiles of a time/depth series
+
+        Input:
+        - timestamps, depths: The series the profiles were found in.
+                They are referenced, not copied.
+        - starts, ends: First and past the last row of each profile.
+        """
+
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.depths = np.asarray(depths, dtype=np.float64)
+
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+
+        self.records = np.zeros(len(starts), dtype=self.dtype)
+        self.records['start'] = starts
+        self.records['end'] = ends
+        if len(starts) > 0:
+            timestamps = self.timestamps
+            depths = self.depths
+            self.records['t_start'] = np.minimum.reduceat(timestamps, starts)
+            self.records['t_end'] = np.maximum.reduceat(timestamps, starts)
+            self.records['depth_min'] = np.minimum.reduceat(depths, starts)
+            self.records['depth_max'] = np.maximum.reduceat(depths, starts)
+            self.records['direction'] = np.sign(
+                self.depths[ends - 1] - self.depths[starts]
+            )
+
+    @classmethod
+    def from_dataset(cls, profiled_dataset):
+        """Builds the index of an Nx3 array of timestamps, depth and profile ids
+
+        Profile ids must be sorted, as returned by find_yo_extrema.  Rows
+        with a negative id (no profiles found) belong to no profile.
+
+        Raises
+        ------
+        ValueError
+            If the dataset is empty.
+        IndexError
+            If the profile ids are not consecutive.
+        """
+
+        if len(profiled_dataset) == 0:
+            raise ValueError('No profiles to index')
+
+        profile_ids = profiled_dataset[:, 2]
+        boundaries = np.flatnonzero(np.diff(profile_ids)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(profiled_dataset)]))
+
+        first_ids = profile_ids[starts]
+        profiled = first_ids >= 0
+        starts = starts[profiled]
+        ends = ends[profiled]
+        if not np.array_equal(first_ids[profiled], np.arange(len(starts))):
+            raise IndexError('Profile ids are not consecutive')
+
+        return cls(
+            profiled_dataset[:, TIME_DIM],
+            profiled_dataset[:, DATA_DIM],
+            starts,
+            ends
+        )
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, key):
+        return self.records[key]
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def find(self, times):
+        """Maps times to the ids of the profiles spanning them
+
+        Returns -1 for times outside of every profile.
+        """
+
+        times = np.asarray(times, dtype=np.float64)
+        profile_ids = np.searchsorted(
+            self.records['t_start'], times, side='right'
+        ) - 1
+
+        found = profile_ids >= 0
+        t_end = self.records['t_end'][profile_ids[found]]
+        found[found] = times[found] <= t_end
+        return np.where(found, profile_ids, -1)
+
+    def merge(self, keep):
+        """Merges the profiles not kept into the next kept one
+
+        Rows after the last kept profile become a profile of their own, as
+        do all rows when there are no profiles at all.
+
+        Returns a new ProfileIndex
+        """
+
+        length = len(self.timestamps)
+        ends = self.records['end'][np.asarray(keep, dtype=bool)]
+        if len(ends) == 0 or ends[-1] < length:
+            ends = np.append(ends, length)
+        starts = np.concatenate(([0], ends[:-1]))
+
+        return ProfileIndex(self.timestamps, self.depths, starts, ends)
+
+    def to_dataset(self):
+        """Returns the Nx3 array of timestamps, depth and profile ids
+        """
+
+        # Each row gets the number of profiles ending at or before it
+        ends = self.records['end']
+        increments = np.zeros(len(self.timestamps), dtype=np.int64)
+        increments[ends[ends < len(self.timestamps)]] = 1
+
+        return np.column_stack((
+            self.timestamps,
+            self.depths,
+            np.cumsum(increments)
+        ))
+
+
+class YoDetector(object):
+    """Finds yo profiles in a time/depth series read in chunks
+
+    Gives the profiles of find_yo_extrema over the whole series, but returns
+    each one as soon as the inflection ending it is confirmed and keeps the
+    smoothing and inflection state between chunks, so profiles straddling
+    segments are joined and numbered across them.
+
+    An inflection is confirmed once the depths smoothed around it only
+    depend on valid depths already read.  Only the rows since the last
+    inflection and a few rows of smoothing context are kept.
+
+    Unlike find_yo_extrema, which merges the rows after the last inflection
+    into the last profile, finish() returns them as a profile of their own.
+    """
+
+    # Rows of smoothed depth needed before a row to find an inflection at it
+    context = 2
+
+    def __init__(self):
+        # Row of the series the buffered rows start at
+        self.offset = 0
+        # Row of the series the open profile starts at
+        self.start = 0
+        # Number of profiles returned so far
+        self.profiles = 0
+
+        self.__timestamps = np.empty(0)
+        self.__depths = np.empty(0)
+        # Last valid (time, depth) before the buffered rows
+        self.__anchor = None
+
+    @property
+    def rows(self):
+        """Number of rows read so far"""
+        return self.offset + len(self.__timestamps)
+
+    def update(self, timestamps, depths):
+        """Reads the next chunk of the series
+
+        Returns a ProfileIndex of the profiles completed by the chunk.  Its
+        rows are the rows of those profiles, with the smoothed depths.
+        """
+
+        # Chunks may be short or hold no depths at all, unlike the
+        # series validate_glider_args expects
+        if len(timestamps) != len(depths):
+            raise ValueError('Arguments must all be the same length')
+
+        self.__timestamps = np.concatenate((
+            self.__timestamps, np.asarray(timestamps, dtype=np.float64)
+        ))
+        self.__depths = np.concatenate((
+            self.__depths, np.asarray(depths, dtype=np.float64)
+        ))
+        return self.__detect(False)
+
+    def finish(self):
+        """Ends the series
+
+        Returns a ProfileIndex of the remaining profiles: the profiles
+        completed by the last rows and the rows after the last inflection.
+        """
+
+        return self.__detect(True)
+
+    def __detect(self, final):
+        timestamps = self.__timestamps
+        depths = self.__depths
+
+        with np.errstate(invalid='ignore'):
+            valid = np.flatnonzero(depths > 0)
+
+        est_times = timestamps[valid]
+        est_depths = depths[valid]
+        if self.__anchor is not None:
+            est_times = np.concatenate(([self.__anchor[0]], est_times))
+            est_depths = np.concatenate(([self.__anchor[1]], est_depths))
+
+        # Depths are only final up to the last valid one, rows after it are
+        # interpolated with the next valid depth
+        if final:
+            length = len(timestamps)
+        elif len(valid) > 0:
+            length = valid[-1] + 1
+        else:
+            length = 0
+
+        if len(est_times) == 0 or length == 0:
+            return self.__emit([], final)
+
+        interp_data = np.interp(
+            timestamps[:length],
+            est_times,
+            est_depths,
+            left=est_depths[0],
+            right=est_depths[-1]
+        )
+        interp_data = boxcar_smooth_dataset(interp_data, 5)
+
+        # Smoothed depths near the ends of the buffer depend on rows not
+        # read yet, except at the ends of the series
+        first = 0 if self.offset == 0 else self.context
+        last = length if final else length - self.context
+        if last - first < 3:
+            return self.__emit([], final, interp_data)
+
+        delta_depth = binarize_diff(np.diff(interp_data[first:last]))
+        inflections = np.flatnonzero(delta_depth[1:] != delta_depth[:-1])
+        inflections += first + 1
+        # Skip the inflection starting the open profile
+        inflections = inflections[inflections > self.start - self.offset]
+
+        return self.__emit(inflections, final, interp_data)
+
+    def __emit(self, inflections, final, interp_data=None):
+        bounds = list(inflections)
+        # The rows after the last inflection end the series, unless there
+        # never were any inflections, as find_yo_extrema finds no profiles
+        if final and self.rows > self.start and (bounds or self.profiles):
+            bounds.append(self.rows - self.offset)
+
+        begin = self.start - self.offset
+        if not bounds:
+            return ProfileIndex([], [], [], [])
+
+        end = bounds[-1]
+        ends = np.asarray(bounds, dtype=np.int64) - begin
+        starts = np.concatenate(([0], ends[:-1]))
+        profiles = ProfileIndex(
+            self.__timestamps[begin:end],
+            interp_data[begin:end],
+            starts,
+            ends
+        )
+
+        self.profiles += len(profiles)
+        self.start = self.offset + end
+        self.__trim(end - self.context)
+        return profiles
+
+    def __trim(self, row):
+        """Drops the buffered rows before row, keeping the last valid depth
+        """
+
+        if row <= 0:
+            return
+
+        dropped = self.__depths[:row]
+        with np.errstate(invalid='ignore'):
+            valid = np.flatnonzero(dropped > 0)
+        if len(valid) > 0:
+            self.__anchor = (
+                self.__timestamps[valid[-1]], dropped[valid[-1]]
+            )
+
+        self.__timestamps = self.__timestamps[row:]
+        self.__depths = self.__depths[row:]
+        self.offset += row
@@ -2,45 +2,139 @@
 
 import numpy as np
 
-from gutils.yo import (
-    TIME_DIM,
-    DATA_DIM
-)
+from gutils.yo import ProfileIndex
 
 
 def default_filter(dataset):
-    dataset = filter_profile_depth(dataset)
-    dataset = filter_profile_number_of_points(dataset)
-    dataset = filter_profile_time(dataset)
-    dataset = filter_profile_distance(dataset)
+    return apply_profile_filters(dataset, [
+        depth_check(),
+        number_of_points_check(),
+        time_check(),
+        distance_check()
+    ])
 
-    return dataset
+
+def profile_bounds(dataset):
+    """Finds the rows of each profile of a profiled dataset
+
+    Profile ids must be sorted, as returned by find_yo_extrema and the
+    filters.  Rows with a negative id (no profiles found) belong to no
+    profile.
+
+    Returns the (starts, ends) arrays of the first and past the last row of
+    each profile, indexed by profile id.
+    """
+
+    profiles = ProfileIndex.from_dataset(dataset)
+    return profiles['start'], profiles['end']
+
+
+def apply_profile_filters(dataset, conditions):
+    """Filters out profiles that do not meet a sequence of criteria
+
+    Same as filtering with each condition in turn, but the profile bounds
+    are found once and every condition is evaluated for all profiles at once.
+    A profile that fails a condition is merged into the next good profile.
+
+    Parameters
+    ----------
+    dataset : numpy.ndarray or ProfileIndex
+        An Nx3 array of timestamps, depth and sorted profile ids or the
+        index of its profiles
+    conditions : list
+        Functions of a ProfileIndex returning a boolean array of the
+        profiles to keep, like depth_check
+
+    Returns
+    -------
+    numpy.ndarray or ProfileIndex
+        The filtered set of profiles, of the same type as dataset
+    """
+
+    if isinstance(dataset, ProfileIndex):
+        profiles = dataset
+    else:
+        profiles = ProfileIndex.from_dataset(dataset)
+
+    for condition in conditions:
+        profiles = profiles.merge(condition(profiles))
+
+    if isinstance(dataset, ProfileIndex):
+        return profiles
+    return profiles.to_dataset()
 
 
 def filter_profiles(dataset, conditional):
     """Filters out profiles that do not meet some criteria
 
+    A profile that fails is merged into the next good profile.
+    conditional is called with the Nx3 rows of each profile.
+
     Returns the filtered set of profiles
     """
 
-    filtered_dataset = dataset.copy()
+    def condition(profiles):
+        rows = profiles.to_dataset()
+        return [
+            bool(conditional(rows[start:end]))
+            for start, end in zip(profiles['start'], profiles['end'])
+        ]
+
+    return apply_profile_filters(dataset, [condition])
+
+# Vectorized conditions follow
+
+
+def depth_check(below=None):
+    """Keeps profiles that reach a certain depth (Default: 1m)
+    """
+    below = below or 1
+
+    def condition(profiles):
+        return profiles['depth_max'] >= below
+
+    return condition
+
+
+def time_check(timespan_condition=None):
+    """Keeps profiles that span a number of seconds (Default: 10 seconds)
+    """
+    timespan_condition = timespan_condition or 10
+
+    def condition(profiles):
+        timestamps = profiles.timestamps
+        timespan = (
+            timestamps[profiles['end'] - 1] - timestamps[profiles['start']]
+        )
+        return timespan >= timespan_condition
+
+    return condition
+
+
+def distance_check(distance_condition=None):
+    """Keeps profiles that span a vertical distance (Default: 1m)
+    """
+    distance_condition = distance_condition or 1
+
+    def condition(profiles):
+        depths = profiles.depths
+        distance = np.abs(
+            depths[profiles['end'] - 1] - depths[profiles['start']]
+        )
+        return distance >= distance_condition
 
-    filtered_dataset[:, 2] = 0
+    return condition
 
-    start_index = 0
-    last_good_profile = 0
-    num_profiles = int(max(dataset[:, 2]) + 1)
-    for profile_id in range(0, num_profiles):
-        profile = dataset[dataset[:, 2] == profile_id]
-        end_index = np.where(dataset[:, 2] == profile_id)[0][-1] + 1
-        if conditional(profile):
-            filtered_dataset[start_index:end_index, 2] = last_good_profile
-            start_index = end_index
-            last_good_profile += 1
-        elif len(dataset) == end_index:
-            filtered_dataset[start_index:, 2] = last_good_profile
 
-    return filtered_dataset
+def number_of_points_check(points_condition=None):
+    """Keeps profiles with a number of points (Default: 5 points)
+    """
+    points_condition = points_condition or 5
+
+    def condition(profiles):
+        return (profiles['end'] - profiles['start']) >= points_condition
+
+    return condition
 
 # Convenience methods follow
 
@@ -50,13 +144,7 @@ def filter_profile_depth(dataset, below=None):
 
     Returns the filtered set of profiles
     """
-    below = below or 1
-
-    def conditional(profile):
-        depth_max = max(profile[:, DATA_DIM])
-        return depth_max >= below
-
-    return filter_profiles(dataset, conditional)
+    return apply_profile_filters(dataset, [depth_check(below)])
 
 
 def filter_profile_time(dataset, timespan_condition=None):
@@ -65,13 +153,7 @@ def filter_profile_time(dataset, timespan_condition=None):
 
     Returns the filtered set of profiles
     """
-    timespan_condition = timespan_condition or 10
-
-    def conditional(profile):
-        timespan = profile[-1, TIME_DIM] - profile[0, TIME_DIM]
-        return timespan >= timespan_condition
-
-    return filter_profiles(dataset, conditional)
+    return apply_profile_filters(dataset, [time_check(timespan_condition)])
 
 
 def filter_profile_distance(dataset, distance_condition=None):
@@ -80,13 +162,9 @@ def filter_profile_distance(dataset, distance_condition=None):
 
     Returns the filtered set of profiles
     """
-    distance_condition = distance_condition or 1
-
-    def conditional(profile):
-        distance = abs(profile[-1, DATA_DIM] - profile[0, DATA_DIM])
-        return distance >= distance_condition
-
-    return filter_profiles(dataset, conditional)
+    return apply_profile_filters(
+        dataset, [distance_check(distance_condition)]
+    )
 
 
 def filter_profile_number_of_points(dataset, points_condition=None):
@@ -95,9 +173,6 @@ def filter_profile_number_of_points(dataset, points_condition=None):
 
     Returns the filtered set of profiles
     """
-    points_condition = points_condition or 5
-
-    def conditional(profile):
-        return len(profile) >= points_condition
-
-    return filter_profiles(dataset, conditional)
+    return apply_profile_filters(
+        dataset, [number_of_points_check(points_condition)]
+    )
@@ -26,7 +26,10 @@ from gutils.scripts.create_glider_netcdf import process_dataset
 from gutils.yo import find_yo_extrema
 from gutils.gps import interpolate_gps
 from gutils.yo.filters import default_filter
-from gutils.gbdr.methods import parse_glider_filename
+from gutils.gbdr.methods import parse_glider_filename, columns_to_rows
+from gutils.gbdr.cache import SegmentCache
+from gutils.gbdr.sensor_lists import SensorListCache
+from gutils.nc import UVBackfill
 from gutils.level0 import *
 
 
@@ -53,6 +56,9 @@ def main():
 
     nc_dir = '/home/slocum/netcdf'
 
+    # Decoded segments, reused by every pass over the files
+    segment_cache = SegmentCache(os.path.join(nc_dir, '.segment_cache'))
+
     processing_cache_file = '/home/slocum/already_processed.pkl'
 
     if os.path.isfile(processing_cache_file):
@@ -72,6 +78,13 @@ def main():
 
         start_time = deployment.start_time
 
+        # Sensor lists of the deployment, kept apart from other deployments
+        sensor_lists = SensorListCache(os.path.join(
+            nc_dir, '.cac', '{}-{}'.format(
+                platform_name.lower(), start_time.strftime('%Y%m%dT%H%M%S')
+            )
+        ))
+
         files = os.listdir(raw_data_path)
         flight_files = []
         science_files = []
@@ -83,10 +96,12 @@ def main():
                     science_files.append(os.path.join(raw_data_path, f))
 
         sorted_files = pair_files(flight_files, science_files)
+        # Knows which files carry the full sensor lists before any decoding
+        sensor_lists.index(flight_files + science_files)
 
         try:
-            flightReader = GliderBDReader([sorted_files[0][0]])
-            scienceReader = GliderBDReader([sorted_files[0][1]])
+            flightReader = GliderBDReader([sorted_files[0][0]], cache=segment_cache, cache_path=sensor_lists)
+            scienceReader = GliderBDReader([sorted_files[0][1]], cache=segment_cache, cache_path=sensor_lists)
             reader = MergedGliderBDReader(flightReader, scienceReader)
         except ValueError:
             print(flight_files)
@@ -116,6 +131,11 @@ def main():
         # pp = pprint.PrettyPrinter(indent=4)
         # pp.pprint(sorted(list(group_headers(reader.headers).keys())))
 
+        # Every profile file of the deployment starts as a copy of a template
+        template_dir = tempfile.mkdtemp()
+        template_path = os.path.join(template_dir, 'template.nc')
+        init_template(template_path, json)
+
         for i, pair in enumerate(sorted_files):
             if pair[0] in already_processed[deployment_name] or pair[1] in already_processed[deployment_name]:
                 print("Already processed: %s. Skipping" % pair)
@@ -133,8 +153,14 @@ def main():
 
             try:
                 try:
+                    # Decode and merge the file pair once, everything else derives from it
+                    frame = read_frame(
+                        flight_path, science_path,
+                        cache=segment_cache, cache_path=sensor_lists
+                    )
+
                     # Find profile breaks
-                    profiles = find_profiles(flight_path, science_path, 'timestamp', 'm_depth-m')
+                    profiles = find_profiles(flight_path, science_path, 'timestamp', 'm_depth-m', frame=frame)
                 except IndexError:
                     print("Something strange happened on files: %s" % (pair))
                     print("Mission: %s" % deployment.__dict__)
@@ -143,14 +169,16 @@ def main():
 
                 # Interpolate GPS
                 interp_gps = get_file_set_gps(
-                    flight_path, science_path, timestr, 'm_gps_'
+                    flight_path, science_path, timestr, 'm_gps_',
+                    frame=frame
                 )
 
                 interp_time = get_file_set_timestamps(
                     flight_path,
                     science_path,
                     'm_present_time-timestamp',
-                    'sci_m_present_time-timestamp'
+                    'sci_m_present_time-timestamp',
+                    frame=frame
                 )
             except ValueError as e:
                 print('{} - Skipping'.format(e))
@@ -158,14 +186,19 @@ def main():
                 continue
             print("Not skipping: %s" % (i + 1))
 
+            fill_gps_columns(frame, interp_gps, 'm_gps_')
+            fill_timestamp_columns(frame, interp_time, 'sci_m_present_time-timestamp')
+
             # Create NetCDF Files for Each Profile
             profile_id = 0
             profile_end = 0
             file_path = None
-            uv_values = None
+            glider_nc = None
             movepairs = []
-            empty_uv_processed_paths = []
-            reader = create_reader(flight_path, science_path)
+            # Profiles waiting for UV values stay open instead of being
+            # reopened once they arrive
+            uv_backfill = UVBackfill()
+            reader = columns_to_rows(frame)
 
             # Tempdirectory
             tmpdir = tempfile.mkdtemp()
@@ -173,6 +206,9 @@ def main():
             for line in reader:
                 if profile_end < line[timestr]:
                     # New profile! init the NetCDF output file
+                    if glider_nc is not None:
+                        uv_backfill.close(glider_nc)
+                        glider_nc = None
 
                     # Path to hold file while we create it
                     fd, tmp_path = tempfile.mkstemp(dir=tmpdir, suffix='.nc', prefix='gutils')
@@ -194,55 +230,49 @@ def main():
 
                     # NOTE: Store 1 based profile id
                     try:
-                        init_netcdf(tmp_path, attrs, i + 1, profile_id + 1)
+                        init_netcdf(tmp_path, attrs, i + 1, profile_id + 1, template_path)
                     except:
                         print(tmp_path)
                         raise
-                    profile = profiles[profiles[:, 2] == profile_id]
-                    if len(profile) < 1:
+                    if profile_id >= len(profiles):
                         continue
-                    profile_end = max(profile[:, 0])
+                    profile_end = profiles['t_end'][profile_id]
 
                 if os.path.isfile(file_path):
                     # We already processed this file, carry on
                     print("Already created: %s. Skipping" % file_path)
                     break
 
-                with sensor_tracker_interface.OpenGliderNetCDFWriterInterface(tmp_path, platform_name, start_time, 'a') as glider_nc:
-                    while line[timestr] <= profile_end:
-                        line = fill_gps(line, interp_gps, 'timestamp', 'm_gps_')
-                        line = fill_timestamp(line, interp_time, 'sci_m_present_time-timestamp')
-
-                        glider_nc.stream_dict_insert(line)
-                        try:
-                            line = reader.__next__()
-                        except StopIteration:
-                            break
-
-                    # Handle UV Variables
-                    if glider_nc.contains('time_uv'):
-                        uv_values = backfill_uv_variables(
-                            glider_nc, empty_uv_processed_paths
-                        )
-                    elif uv_values is not None:
-                        fill_uv_variables(glider_nc, uv_values)
-                        del empty_uv_processed_paths[:]
-                    else:
-                        empty_uv_processed_paths.append(tmp_path)
-
-                    glider_nc.update_profile_vars()
+                if glider_nc is None:
+                    glider_nc = sensor_tracker_interface.OpenGliderNetCDFWriterInterface(tmp_path, platform_name, start_time, 'a').open()
+
+                while line[timestr] <= profile_end:
+                    glider_nc.stream_dict_insert(line)
                     try:
-                        glider_nc.calculate_salinity()
-                        glider_nc.calculate_density()
-                    except BaseException as e:
-                        print(e)
+                        line = next(reader)
+                    except StopIteration:
+                        break
+
+                # Handle UV Variables
+                uv_backfill.update(glider_nc)
 
-                    glider_nc.update_bounds()
+                glider_nc.update_profile_vars()
+                try:
+                    glider_nc.calculate_salinity()
+                    glider_nc.calculate_density()
+                except BaseException as e:
+                    print(e)
+
+                glider_nc.update_bounds()
 
                 movepairs.append((tmp_path, file_path))
 
                 profile_id += 1
 
+            if glider_nc is not None:
+                uv_backfill.close(glider_nc)
+            # No UV values after these, closed as they are
+            uv_backfill.finish()
 
             for tp, fp in movepairs:
                 try:
@@ -256,6 +286,8 @@ def main():
             with open(processing_cache_file, 'wb') as f:
                 pickle.dump(already_processed, f)
 
+        shutil.rmtree(template_dir)
+
 
 if __name__ == '__main__':
     main()
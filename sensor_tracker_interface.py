@@ -466,23 +466,23 @@ DEFAULT_GLIDER_BASE = os.path.dirname(__file__)
 
 
 def open_glider_netcdf(output_path, platform, start_time, mode=None, COMP_LEVEL=None,
-                       config_path=None, DEBUG=False):
+                       config_path=None, DEBUG=False, buffer_rows=None, time_length=None,
+                       storage=None):
     mode = mode or 'w'
     COMP_LEVEL = COMP_LEVEL or 1
     config_path = config_path or DEFAULT_GLIDER_BASE
-    return OpenGliderNetCDFWriterInterface(output_path, platform, start_time, mode, COMP_LEVEL, config_path, DEBUG)
+    return OpenGliderNetCDFWriterInterface(output_path, platform, start_time, mode, COMP_LEVEL, config_path, DEBUG, buffer_rows, time_length, storage)
 
 
 class OpenGliderNetCDFWriterInterface(GliderNetCDFWriter):
     def __init__(self, output_path, platform, start_time, mode=None, COMP_LEVEL=None,
-                 config_path=None, DEBUG=False):
-        self.nc = None
-        self.output_path = output_path
-        self.mode = mode or 'w'
-        self.COMP_LEVEL = COMP_LEVEL or 1
-        self.config_path = config_path or DEFAULT_GLIDER_BASE
-        self.DEBUG = DEBUG
-        self.datatypes = {}
+                 config_path=None, DEBUG=False, buffer_rows=None, time_length=None,
+                 storage=None):
+        super(OpenGliderNetCDFWriterInterface, self).__init__(
+            output_path, mode, COMP_LEVEL,
+            config_path or DEFAULT_GLIDER_BASE, DEBUG, buffer_rows,
+            time_length, storage
+        )
         self.platform = platform
         self.start_time = start_time
 
@@ -508,8 +508,14 @@ class OpenGliderNetCDFWriterInterface(GliderNetCDFWriter):
         # Append types from the sensor tracker
         st = SensorTrackerInterface()
         sensors = st.get_json_instrument_metadata_for_deployment(platform, start_time)
+        datatypes = {}
         for s in sensors:
             if s not in self.datatypes:
-                self.datatypes[s] = sensors[s]
+                datatypes[s] = sensors[s]
             else:
-                self.datatypes[s]['attrs'].update(sensors[s]['attrs'])
+                # The datatypes.json schema is shared, update a copy
+                datatype = dict(self.datatypes[s])
+                datatype['attrs'] = dict(datatype['attrs'])
+                datatype['attrs'].update(sensors[s]['attrs'])
+                datatypes[s] = datatype
+        self.append_datatypes(datatypes)
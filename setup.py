@@ -32,6 +32,7 @@ setup(
         'gutils.gbdr'
     ],
     scripts=[
+        'gutils/scripts/benchmark_glider_netcdf.py',
         'gutils/scripts/check_glider_netcdf.py',
         'gutils/scripts/create_glider_netcdf.py',
     ],
@@ -1,14 +1,30 @@
 #!/usr/bin/env python
 
 import os
+import shutil
+import tempfile
 import unittest
 from glob import glob
 
+import numpy as np
+
 from gutils.gbdr.methods import (
+    columns_to_rows,
     create_glider_BD_ASCII_reader,
+    ddmm_to_decimal,
     find_glider_BD_headers,
-    get_decimal_degrees
+    get_decimal_degrees,
+    GliderRow,
+    merge_columns,
+    merge_heap,
+    merge_increasing_pair,
+    merge_timelines,
+    rows_to_columns
 )
+from gutils.gbdr import methods
+from gutils.gbdr.cache import SegmentCache
+from gutils.gbdr.sensor_lists import SensorListCache
+from gutils.gbdr.decoder import decode_glider_BD_files
 from gutils.gbdr import GliderBDReader, MergedGliderBDReader
 
 import logging
@@ -41,6 +57,53 @@ class TestASCIIReader(unittest.TestCase):
         )
 
 
+class TestNativeDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_path)
+
+    def assertMatchesDbd2asc(self, filePaths):
+        reader = create_glider_BD_ASCII_reader(filePaths)
+        headers = find_glider_BD_headers(reader)
+        expected = np.loadtxt(reader, ndmin=2).reshape(-1, len(headers))
+
+        native_headers, data = decode_glider_BD_files(
+            filePaths, self.cache_path
+        )
+        self.assertEqual(headers, native_headers)
+        self.assertEqual(expected.shape, data.shape)
+        np.testing.assert_allclose(data, expected, rtol=1e-5)
+
+    def test_flight_files(self):
+        self.assertMatchesDbd2asc(
+            sorted(glob(os.path.join(testdata_path, '*.sbd')))
+        )
+
+    def test_science_files(self):
+        self.assertMatchesDbd2asc(
+            sorted(glob(os.path.join(testdata_path, '*.tbd')))
+        )
+
+    def test_factored_sensor_list(self):
+        # Only the first segment of the mission carries the sensor list
+        self.assertMatchesDbd2asc(
+            [os.path.join(testdata_path, 'usf-bass-2014-048-2-3.sbd')]
+        )
+        self.assertEqual(len(glob(os.path.join(self.cache_path, '*.cac'))), 1)
+
+    def test_native_reader(self):
+        reader = GliderBDReader(
+            glob(os.path.join(testdata_path, '*.tbd')),
+            native=True
+        )
+        for value in reader:
+            self.assertIn('timestamp', value)
+            self.assertIn('sci_m_present_secs_into_mission-sec', value)
+
+
 class TestUtility(unittest.TestCase):
 
     def test_decimal_degrees(self):
@@ -50,6 +113,37 @@ class TestUtility(unittest.TestCase):
             -83.50945
         )
 
+    def test_ddmm_to_decimal(self):
+        # Results of the former string conversion
+        values = [
+            -8330.567,
+            2745.12353515625,
+            -8016.67009999988,
+            1251.1947901776603,
+            346.3913977146148,
+            69696969.0
+        ]
+        expected = [
+            -83.50945,
+            27.752058919270834,
+            -80.277834999998,
+            12.853246502961005,
+            3.7731899619102465,
+            696970.15
+        ]
+        decimal = ddmm_to_decimal(values)
+        np.testing.assert_allclose(decimal, expected, rtol=1e-12)
+        self.assertEqual(
+            [get_decimal_degrees(value) for value in values],
+            decimal.tolist()
+        )
+
+    def test_ddmm_to_decimal_special_values(self):
+        np.testing.assert_array_equal(
+            ddmm_to_decimal([0, np.nan, np.inf, 45.5, -5.5, 8400.0]),
+            [-1, np.nan, -1, 0.7583333333333333, -0.09166666666666666, 84]
+        )
+
 
 class TestBDReader(unittest.TestCase):
 
@@ -66,6 +160,303 @@ class TestBDReader(unittest.TestCase):
             )
 
 
+class TestBDReaderColumns(unittest.TestCase):
+
+    def assertColumnsMatchRows(self, filePaths, native=False):
+        rows = list(GliderBDReader(filePaths, native=native))
+        columns = GliderBDReader(filePaths, native=native).read_columns()
+
+        self.assertIn('timestamp', columns)
+        for key, column in columns.items():
+            self.assertEqual(len(column), len(rows))
+            expected = np.array([row.get(key, np.nan) for row in rows])
+            np.testing.assert_array_equal(column, expected)
+
+    def test_flight_columns(self):
+        self.assertColumnsMatchRows(
+            sorted(glob(os.path.join(testdata_path, '*.sbd')))
+        )
+
+    def test_science_columns(self):
+        self.assertColumnsMatchRows(
+            sorted(glob(os.path.join(testdata_path, '*.tbd')))
+        )
+
+    def test_native_columns(self):
+        self.assertColumnsMatchRows(
+            sorted(glob(os.path.join(testdata_path, '*.sbd'))),
+            native=True
+        )
+
+    def test_consumes_reader(self):
+        reader = GliderBDReader(glob(os.path.join(testdata_path, '*.tbd')))
+        next(reader)
+        columns = reader.read_columns()
+        self.assertRaises(StopIteration, next, reader)
+        self.assertEqual(len(reader.read_columns()['timestamp']), 0)
+        self.assertGreater(len(columns['timestamp']), 0)
+
+
+class TestStreamingBDReader(unittest.TestCase):
+
+    def setUp(self):
+        self.filePaths = sorted(
+            glob(os.path.join(testdata_path, '..', 'usf-2016', '*.sbd'))
+        )
+
+    def test_matches_buffered(self):
+        buffered = list(GliderBDReader(self.filePaths))
+        streamed = list(GliderBDReader(self.filePaths, stream=True))
+        self.assertEqual(buffered, streamed)
+
+    def test_first_row_before_exit(self):
+        reader = GliderBDReader(self.filePaths, stream=True)
+        self.assertIn('timestamp', next(reader))
+        self.assertIsNone(reader.reader.process.poll())
+
+        reader.close()
+        self.assertIsNotNone(reader.reader.process.returncode)
+        self.assertRaises(StopIteration, next, reader)
+
+    def test_streamed_columns(self):
+        buffered = GliderBDReader(self.filePaths).read_columns()
+        streamed = GliderBDReader(self.filePaths, stream=True).read_columns()
+        self.assertEqual(sorted(buffered), sorted(streamed))
+        for key in buffered:
+            np.testing.assert_array_equal(buffered[key], streamed[key])
+
+    def test_no_cache_available(self):
+        for fileName in glob("/tmp/*.cac"):
+            os.remove(fileName)
+
+        reader = GliderBDReader(
+            [os.path.join(testdata_path, 'usf-bass-2014-048-2-3.sbd')],
+            stream=True
+        )
+        self.assertGreater(len(list(reader)), 0)
+        self.assertEqual(reader.reader.process.returncode, 0)
+
+
+class TestSensorProjection(unittest.TestCase):
+
+    sensors = ['m_depth-m', 'm_gps_lat', 'sci_water_temp-degc']
+
+    def setUp(self):
+        self.flightPaths = sorted(glob(os.path.join(testdata_path, '*.sbd')))
+        self.sciencePaths = sorted(glob(os.path.join(testdata_path, '*.tbd')))
+
+    def assertProjected(self, full, projected):
+        self.assertEqual(len(full), len(projected))
+        for full_row, projected_row in zip(full, projected):
+            expected = {
+                key: value for key, value in full_row.items()
+                if key.split('-')[0] in (
+                    'timestamp', 'm_present_time', 'sci_m_present_time',
+                    'm_depth', 'm_gps_lat', 'sci_water_temp'
+                )
+            }
+            self.assertEqual(expected, projected_row)
+
+    def test_projected_rows(self):
+        self.assertProjected(
+            list(GliderBDReader(self.flightPaths)),
+            list(GliderBDReader(self.flightPaths, sensors=self.sensors))
+        )
+
+    def test_projected_native_rows(self):
+        reader = GliderBDReader(
+            self.flightPaths, native=True, sensors=self.sensors
+        )
+        self.assertEqual(
+            sorted(h['name'] for h in reader.headers),
+            ['m_depth', 'm_gps_lat', 'm_present_time']
+        )
+        self.assertProjected(
+            list(GliderBDReader(self.flightPaths, native=True)),
+            list(reader)
+        )
+
+    def test_projected_columns(self):
+        columns = GliderBDReader(
+            self.flightPaths, sensors=self.sensors
+        ).read_columns()
+        self.assertEqual(
+            sorted(columns),
+            [
+                'm_depth-m', 'm_gps_lat-lat',
+                'm_present_time-timestamp', 'timestamp'
+            ]
+        )
+
+    def test_projected_merge(self):
+        full = MergedGliderBDReader(
+            GliderBDReader(self.flightPaths),
+            GliderBDReader(self.sciencePaths)
+        )
+        projected = MergedGliderBDReader(
+            GliderBDReader(self.flightPaths),
+            GliderBDReader(self.sciencePaths),
+            sensors=self.sensors
+        )
+        self.assertProjected(list(full), list(projected))
+
+
+class TestSegmentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = SegmentCache(self.cache_dir)
+        self.filePaths = sorted(glob(os.path.join(testdata_path, '*.tbd')))
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def assertSameRows(self, expected, actual):
+        self.assertEqual(len(expected), len(actual))
+        for expected_row, row in zip(expected, actual):
+            self.assertEqual(expected_row, row)
+
+    def test_matches_reader(self):
+        self.assertSameRows(
+            list(GliderBDReader(self.filePaths)),
+            list(GliderBDReader(self.filePaths, cache=self.cache))
+        )
+        self.assertEqual(
+            len(glob(os.path.join(self.cache_dir, '*.npy'))),
+            len(self.filePaths)
+        )
+
+    def test_hit_does_not_run_dbd2asc(self):
+        expected = list(GliderBDReader(self.filePaths, cache=self.cache))
+
+        dbd2asc_path = methods.dbd2asc_path
+        methods.dbd2asc_path = os.path.join(self.cache_dir, 'missing')
+        try:
+            self.assertSameRows(
+                expected,
+                list(GliderBDReader(self.filePaths, cache=self.cache))
+            )
+        finally:
+            methods.dbd2asc_path = dbd2asc_path
+
+    def test_native_entries(self):
+        self.assertSameRows(
+            list(GliderBDReader(self.filePaths, native=True)),
+            list(GliderBDReader(self.filePaths, native=True, cache=self.cache))
+        )
+        self.assertNotEqual(
+            self.cache.key(self.filePaths[0]),
+            self.cache.key(self.filePaths[0], native=True)
+        )
+
+    def test_changed_file(self):
+        path = os.path.join(self.cache_dir, os.path.basename(self.filePaths[0]))
+        shutil.copy(self.filePaths[0], path)
+        key = self.cache.key(path)
+
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 60))
+        self.assertNotEqual(key, self.cache.key(path))
+
+    def test_eviction(self):
+        for path in self.filePaths:
+            self.cache.decode(path)
+        entries = sorted(glob(os.path.join(self.cache_dir, '*.npy')))
+        for i, entry in enumerate(entries):
+            os.utime(entry, (i, i))
+        newest = entries[-1]
+
+        self.cache.max_bytes = os.path.getsize(newest) + 1024
+        self.cache.evict()
+        self.assertEqual(
+            glob(os.path.join(self.cache_dir, '*.npy')),
+            [newest]
+        )
+
+    def test_projected_columns(self):
+        sensors = ['sci_water_temp-degc']
+        self.assertEqual(
+            sorted(GliderBDReader(
+                self.filePaths, sensors=sensors
+            ).read_columns()),
+            sorted(GliderBDReader(
+                self.filePaths, sensors=sensors, cache=self.cache
+            ).read_columns())
+        )
+
+
+class TestSensorListCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.sensor_lists = SensorListCache(self.cache_dir)
+        # Only the first segment of the mission carries the sensor list
+        self.first = os.path.join(testdata_path, 'usf-bass-2014-048-2-0.sbd')
+        self.factored = os.path.join(testdata_path, 'usf-bass-2014-048-2-3.sbd')
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_index(self):
+        (crc, factored), (factored_crc, is_factored) = self.sensor_lists.index(
+            [self.first, self.factored]
+        )
+        self.assertFalse(factored)
+        self.assertTrue(is_factored)
+        self.assertEqual(crc, factored_crc)
+        self.assertEqual(self.sensor_lists.sources, {crc: self.first})
+
+    def test_resolve_without_dbd2asc(self):
+        dbd2asc_path = methods.dbd2asc_path
+        methods.dbd2asc_path = os.path.join(self.cache_dir, 'missing')
+        try:
+            self.assertTrue(
+                methods.can_find_bd_index(self.factored, self.sensor_lists)
+            )
+        finally:
+            methods.dbd2asc_path = dbd2asc_path
+
+        self.assertEqual(
+            len(glob(os.path.join(self.cache_dir, '*.cac'))), 1
+        )
+
+    def test_missing_sensor_list(self):
+        path = os.path.join(self.cache_dir, os.path.basename(self.factored))
+        shutil.copy(self.factored, path)
+
+        self.assertFalse(methods.can_find_bd_index(path, self.cache_dir))
+        with self.assertRaises(KeyError):
+            create_glider_BD_ASCII_reader([path], cache_path=self.cache_dir)
+
+    def test_shared_files_untouched(self):
+        GliderBDReader([self.first], cache_path=self.sensor_lists)
+        cache_file = glob(os.path.join(self.cache_dir, '*.cac'))[0]
+        os.utime(cache_file, (0, 0))
+
+        # dbd2asc rewrites the cache files it reads a sensor list for
+        for stream in (False, True):
+            reader = GliderBDReader(
+                [self.first, self.factored],
+                stream=stream,
+                cache_path=self.sensor_lists
+            )
+            self.assertGreater(len(list(reader)), 0)
+
+        self.assertEqual(os.path.getmtime(cache_file), 0)
+        self.assertEqual(os.listdir(self.cache_dir), [
+            os.path.basename(cache_file)
+        ])
+
+    def test_matches_reader(self):
+        expected = list(GliderBDReader([self.factored]))
+        self.assertEqual(expected, list(GliderBDReader(
+            [self.factored], cache_path=self.cache_dir
+        )))
+        self.assertEqual(len(expected), len(list(GliderBDReader(
+            [self.factored], native=True, cache_path=self.cache_dir
+        ))))
+
+
 class TestMergedGliderDataReader(unittest.TestCase):
 
     def setUp(self):
@@ -85,6 +476,173 @@ class TestMergedGliderDataReader(unittest.TestCase):
             )
             self.assertTrue(time_present)
 
+    def test_columns(self):
+        flightPaths = sorted(glob(os.path.join(testdata_path, '*.sbd')))
+        sciencePaths = sorted(glob(os.path.join(testdata_path, '*.tbd')))
+        rows = list(MergedGliderBDReader(
+            GliderBDReader(flightPaths),
+            GliderBDReader(sciencePaths)
+        ))
+        columns = MergedGliderBDReader(
+            GliderBDReader(flightPaths),
+            GliderBDReader(sciencePaths)
+        ).read_columns()
+
+        self.assertEqual(len(columns['timestamp']), len(rows))
+        self.assertEqual(list(columns_to_rows(columns)), rows)
+
+
+class TestGliderRow(unittest.TestCase):
+
+    def setUp(self):
+        self.index = {'m_depth-m': 0, 'm_pitch-rad': 1, 'timestamp': 2}
+        self.row = GliderRow(self.index, [5.0, float('nan'), 10.0])
+
+    def test_mapping(self):
+        self.assertIn('m_depth-m', self.row)
+        self.assertNotIn('m_pitch-rad', self.row)
+        self.assertNotIn('m_roll-rad', self.row)
+        self.assertEqual(self.row['timestamp'], 10)
+        self.assertRaises(KeyError, lambda: self.row['m_pitch-rad'])
+        self.assertIsNone(self.row.get('m_pitch-rad'))
+        self.assertEqual(self.row.get('m_roll-rad', 1), 1)
+        self.assertEqual(len(self.row), 2)
+        self.assertEqual(sorted(self.row), ['m_depth-m', 'timestamp'])
+        self.assertEqual(self.row, {'m_depth-m': 5, 'timestamp': 10})
+        self.assertEqual(dict(self.row), {'m_depth-m': 5, 'timestamp': 10})
+
+    def test_set_and_delete(self):
+        other = GliderRow(self.index, [6.0, 0.1, 11.0])
+
+        self.row['m_pitch-rad'] = 0.5
+        self.row['lat'] = 27.5
+        del self.row['m_depth-m']
+        self.assertEqual(
+            self.row, {'m_pitch-rad': 0.5, 'lat': 27.5, 'timestamp': 10}
+        )
+        # Rows sharing the index are left alone
+        self.assertEqual(
+            other, {'m_depth-m': 6, 'm_pitch-rad': 0.1, 'timestamp': 11}
+        )
+
+    def test_reader_rows(self):
+        flightPaths = sorted(glob(os.path.join(testdata_path, '*.sbd')))
+        sciencePaths = sorted(glob(os.path.join(testdata_path, '*.tbd')))
+        reader = MergedGliderBDReader(
+            GliderBDReader(flightPaths, native=True),
+            GliderBDReader(sciencePaths, native=True)
+        )
+        rows = list(reader)
+        self.assertTrue(all(isinstance(row, GliderRow) for row in rows))
+
+        merged = [
+            row for row in rows
+            if 'm_present_time-timestamp' in row and
+            'sci_m_present_time-timestamp' in row
+        ]
+        self.assertGreater(len(merged), 0)
+        # Merged rows share one index and take the science timestamp
+        self.assertEqual(len(set(id(row.index) for row in merged)), 1)
+        for row in merged:
+            self.assertEqual(
+                row['timestamp'], row['sci_m_present_time-timestamp']
+            )
+
+
+class TestMergeColumns(unittest.TestCase):
+
+    def test_merge_timelines(self):
+        indices = merge_timelines([
+            [0, 0.5, 3, 10, 11],
+            [0.9, 2.5, 4, 12]
+        ])
+        # The earliest rows within tolerance are merged, not the closest
+        np.testing.assert_array_equal(indices, [
+            [0, 0],
+            [1, -1],
+            [2, 1],
+            [-1, 2],
+            [3, -1],
+            [4, 3]
+        ])
+
+    def test_increasing_pair_matches_heap(self):
+        random = np.random.RandomState(0)
+        for _ in range(200):
+            first = np.unique(random.randint(0, 60, 30)) + random.rand()
+            second = np.unique(random.randint(0, 60, 30)).astype(np.float64)
+            for tolerance in (0, 0.5, 1, 3):
+                np.testing.assert_array_equal(
+                    merge_increasing_pair(first, second, tolerance),
+                    merge_heap([first, second], tolerance)
+                )
+
+    def test_unordered(self):
+        # Heads are compared as the iterator does, whatever their order
+        np.testing.assert_array_equal(
+            merge_timelines([[5, 1, 2], [1.5, 4.5]]),
+            [[-1, 0], [0, 1], [1, -1], [2, -1]]
+        )
+
+    def test_merge_columns(self):
+        flight = {
+            'timestamp': np.array([0, 2, 5], dtype=np.float64),
+            'm_depth-m': np.array([1, 2, 3], dtype=np.float64),
+            'shared-x': np.array([1, 1, np.nan])
+        }
+        science = {
+            'timestamp': np.array([2.5, 9], dtype=np.float64),
+            'sci_water_temp-degc': np.array([20, 21], dtype=np.float64),
+            'shared-x': np.array([2, np.nan]),
+            'sci_empty-x': np.array([np.nan, np.nan])
+        }
+        extra = {
+            'timestamp': np.array([8.5], dtype=np.float64),
+            'extra-x': np.array([7], dtype=np.float64)
+        }
+
+        merged = merge_columns([flight, science])
+        self.assertEqual(
+            list(columns_to_rows(merged)),
+            [
+                {'timestamp': 0, 'm_depth-m': 1, 'shared-x': 1},
+                {'timestamp': 2.5, 'm_depth-m': 2, 'shared-x': 2,
+                 'sci_water_temp-degc': 20},
+                {'timestamp': 5, 'm_depth-m': 3},
+                {'timestamp': 9, 'sci_water_temp-degc': 21}
+            ]
+        )
+
+        # Any number of streams, later ones taking precedence
+        merged = merge_columns([flight, science, extra])
+        np.testing.assert_array_equal(merged['timestamp'], [0, 2.5, 5, 8.5])
+        np.testing.assert_array_equal(
+            merged['extra-x'], [np.nan, np.nan, np.nan, 7]
+        )
+        np.testing.assert_array_equal(
+            merged['sci_water_temp-degc'], [np.nan, 20, np.nan, 21]
+        )
+
+    def test_reader_columns(self):
+        flightPaths = sorted(glob(os.path.join(testdata_path, '*.sbd')))
+        sciencePaths = sorted(glob(os.path.join(testdata_path, '*.tbd')))
+        for merge_tolerance in (0, 1, 5):
+            rows = MergedGliderBDReader(
+                GliderBDReader(flightPaths, native=True),
+                GliderBDReader(sciencePaths, native=True),
+                merge_tolerance=merge_tolerance
+            )
+            columns = MergedGliderBDReader(
+                GliderBDReader(flightPaths, native=True),
+                GliderBDReader(sciencePaths, native=True),
+                merge_tolerance=merge_tolerance
+            ).read_columns()
+
+            expected = rows_to_columns(rows)
+            self.assertEqual(sorted(columns), sorted(expected))
+            for key in expected:
+                np.testing.assert_array_equal(columns[key], expected[key])
+
 
 class TestNoCacheAvailable(unittest.TestCase):
 
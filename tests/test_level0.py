@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+import os
+import unittest
+
+import numpy as np
+
+from gutils.gbdr.methods import columns_to_rows
+from gutils.level0 import (
+    correct_science_times,
+    fill_gps,
+    fill_gps_columns,
+    fill_timestamp_columns,
+    get_file_set_gps,
+    get_file_set_timestamps,
+    read_frame
+)
+
+import logging
+logger = logging.getLogger()
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.DEBUG)
+
+
+def resource(*args):
+    return os.path.join(
+        os.path.dirname(__file__),
+        'resources',
+        *args
+    )
+
+
+class TestFrame(unittest.TestCase):
+
+    def setUp(self):
+        self.flight_path = resource('usf-bass', 'usf-bass-2014-061-1-0.sbd')
+        self.science_path = resource('usf-bass', 'usf-bass-2014-061-1-0.tbd')
+        self.frame = read_frame(self.flight_path, self.science_path)
+
+    def test_fill_gps_columns(self):
+        interp_gps = get_file_set_gps(
+            None, None, 'timestamp', 'm_gps_', frame=self.frame
+        )
+        expected = [
+            fill_gps(line, interp_gps, 'timestamp', 'm_gps_')
+            for line in columns_to_rows(self.frame)
+        ]
+
+        fill_gps_columns(self.frame, interp_gps, 'm_gps_')
+        self.assertFalse(np.isnan(self.frame['m_gps_lat-lat']).any())
+        self.assertEqual(list(columns_to_rows(self.frame)), expected)
+
+
+class TestScienceTimeCorrection(unittest.TestCase):
+
+    def test_correct_science_times(self):
+        flight_times = np.array([10.0, 20.0, 30.0])
+        corrected_times = np.array([11.0, 19.0, 33.0])
+        science_times = np.array([5.0, 11.0, 15.0, np.nan, 26.0, 40.0])
+
+        expected = [
+            np.interp(t, corrected_times, flight_times)
+            for t in science_times
+        ]
+        np.testing.assert_array_equal(
+            correct_science_times(science_times, flight_times, corrected_times),
+            expected
+        )
+
+    def test_unmatched_rows_skipped(self):
+        frame = read_frame(
+            resource('usf-2016', 'usf-bass-2016-253-0-6.sbd'),
+            resource('usf-2016', 'usf-bass-2016-253-0-6.tbd')
+        )
+        interp_time = get_file_set_timestamps(
+            None, None,
+            'm_present_time-timestamp',
+            'sci_m_present_time-timestamp',
+            frame=frame
+        )
+        self.assertGreater(len(interp_time['flight_times']), 0)
+        self.assertEqual(
+            len(interp_time['flight_times']),
+            len(interp_time['corrected_flight_science_times'])
+        )
+
+        fill_timestamp_columns(
+            frame, interp_time, 'sci_m_present_time-timestamp'
+        )
+        np.testing.assert_array_equal(
+            np.isnan(frame['i_timestamp']),
+            np.isnan(frame['sci_m_present_time-timestamp'])
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,20 +2,41 @@
 
 import os
 import json
+import argparse
+import operator
 import shutil
+import tempfile
 import unittest
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 
 import numpy as np
 import netCDF4 as nc4
+from netCDF4 import default_fillvals as NC_FILL_VALUES
 
 from gutils.gbdr import (
     GliderBDReader,
     MergedGliderBDReader
 )
 
-from gutils.nc import open_glider_netcdf
-from gutils.scripts.create_glider_netcdf import process_dataset
+from gutils.gbdr.methods import columns_to_rows
+from gutils.nc import (
+    open_glider_netcdf,
+    load_datatypes,
+    UVBackfill,
+    DEFAULT_GLIDER_BASE,
+    GLIDER_QC
+)
+from gutils.scripts.benchmark_glider_netcdf import benchmark
+from gutils.level0 import init_netcdf, init_template
+from gutils.scripts.create_glider_netcdf import (
+    process_dataset,
+    read_attrs,
+    read_frame,
+    get_file_set_gps,
+    fill_gps_columns,
+    profile_row_ranges,
+    file_time_lengths
+)
 
 import logging
 logger = logging.getLogger()
@@ -111,6 +132,290 @@ class TestCreateGliderScript(unittest.TestCase):
         output_files = os.listdir(output('bass-20160909T1733Z'))
         assert len(output_files) == 33
 
+    def test_profile_row_ranges(self):
+        timestamps = np.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 5.5, 8.0])
+        profiles = np.array([
+            [1.0, 0.0, 0],
+            [3.0, 0.0, 0],
+            [5.0, 0.0, 1],
+            [6.0, 0.0, 1]
+        ])
+
+        # Rows 3 and 6 end their profiles, row 7 is back within profile 1
+        ranges = profile_row_ranges(timestamps, profiles)
+        self.assertEqual(ranges, [
+            (0, 0, 3, True),
+            (1, 4, 6, True),
+            (2, 7, 8, False)
+        ])
+        self.assertEqual(file_time_lengths(ranges), [3, 3])
+
+
+class TestTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self.template_path = output('template.nc')
+        self.test_path = output('profile.nc')
+        try:
+            os.makedirs(output())
+        except OSError:
+            pass  # Already exists
+
+    def tearDown(self):
+        for path in (self.template_path, self.test_path):
+            os.remove(path)
+
+    def test_clone(self):
+        attrs = read_attrs(resource('usf-bass'))
+        init_template(self.template_path, attrs)
+        init_netcdf(self.test_path, attrs, 3, 4, self.template_path)
+
+        with open_glider_netcdf(self.test_path, 'a') as glider_nc:
+            for key, datatype in glider_nc.datatypes.items():
+                self.assertIn(datatype['name'], glider_nc.nc.variables)
+            self.assertEqual(glider_nc.get_scalar('segment_id'), 3)
+            self.assertEqual(glider_nc.get_scalar('profile_id'), 4)
+            self.assertTrue(glider_nc.contains('time_uv'))
+            self.assertFalse(glider_nc.has_scalar('time_uv'))
+            self.assertIn('instrument_ctd', glider_nc.nc.variables)
+
+            glider_nc.set_scalar('time_uv', 1.0)
+            self.assertTrue(glider_nc.has_scalar('time_uv'))
+
+    def test_fixed_time_length(self):
+        attrs = read_attrs(resource('usf-bass'))
+        init_template(self.template_path, attrs, include_time=False)
+        with nc4.Dataset(self.template_path) as template_nc:
+            self.assertNotIn('time', template_nc.dimensions)
+            self.assertNotIn('depth', template_nc.variables)
+            self.assertIn('segment_id', template_nc.variables)
+
+        init_netcdf(self.test_path, attrs, 3, 4, self.template_path, 10)
+
+        with open_glider_netcdf(self.test_path, 'a') as glider_nc:
+            self.assertEqual(glider_nc.stream_index, 0)
+            glider_nc.write_profile({
+                'timestamp': np.arange(6, dtype=np.float64),
+                'm_depth-m': np.arange(6, dtype=np.float64)
+            })
+
+        with open_glider_netcdf(self.test_path, 'a') as glider_nc:
+            # Continues after the rows written so far
+            self.assertEqual(glider_nc.stream_index, 6)
+            glider_nc.write_profile({
+                'timestamp': np.arange(6, 10, dtype=np.float64)
+            })
+
+        with nc4.Dataset(self.test_path) as nc:
+            self.assertFalse(nc.dimensions['time'].isunlimited())
+            self.assertEqual(len(nc.dimensions['time']), 10)
+            self.assertEqual(nc.variables['depth'].chunking(), [10])
+            np.testing.assert_array_equal(nc.variables['time'][:], range(10))
+
+
+class TestStoragePolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.test_path = output('storage.nc')
+        try:
+            os.makedirs(output())
+        except OSError:
+            pass  # Already exists
+
+    def tearDown(self):
+        os.remove(self.test_path)
+
+    def test_writer_storage(self):
+        storage = {'complevel': 4, 'shuffle': False, 'chunksizes': [16]}
+        with open_glider_netcdf(self.test_path, 'w', storage=storage) as glider_nc:
+            glider_nc.set_trajectory_id('bass', '20160909T1733Z')
+            glider_nc.set_segment_id(1)
+            glider_nc.write_profile({
+                'timestamp': np.arange(40, dtype=np.float64),
+                'm_depth-m': np.arange(40, dtype=np.float64)
+            })
+
+        with nc4.Dataset(self.test_path) as nc:
+            depth = nc.variables['depth']
+            self.assertEqual(depth.chunking(), [16])
+            self.assertTrue(depth.filters()['zlib'])
+            self.assertEqual(depth.filters()['complevel'], 4)
+            self.assertFalse(depth.filters()['shuffle'])
+            self.assertEqual(nc.variables['depth_qc'].chunking(), [16])
+
+            # Scalars and the trajectory string are never compressed
+            self.assertFalse(nc.variables['segment_id'].filters()['zlib'])
+            self.assertFalse(nc.variables['trajectory'].filters()['zlib'])
+
+    def test_datatype_storage(self):
+        with open_glider_netcdf(self.test_path, 'w', time_length=40) as glider_nc:
+            depth = dict(glider_nc.datatypes['m_depth-m'])
+            depth['storage'] = {'contiguous': True}
+            glider_nc.append_datatypes({'m_depth-m': depth})
+            glider_nc.write_profile({
+                'timestamp': np.arange(40, dtype=np.float64),
+                'm_depth-m': np.arange(40, dtype=np.float64)
+            })
+
+        with nc4.Dataset(self.test_path) as nc:
+            self.assertEqual(nc.variables['depth'].chunking(), 'contiguous')
+            self.assertFalse(nc.variables['depth'].filters()['zlib'])
+            self.assertEqual(nc.variables['time'].chunking(), [40])
+            self.assertTrue(nc.variables['time'].filters()['zlib'])
+
+
+class TestDiskless(unittest.TestCase):
+
+    def setUp(self):
+        self.test_path = output('diskless.nc')
+        try:
+            os.makedirs(output())
+        except OSError:
+            pass  # Already exists
+
+    def tearDown(self):
+        try:
+            os.remove(self.test_path)
+        except OSError:
+            pass
+
+    def leftovers(self):
+        return [f for f in os.listdir(output()) if f.endswith('.tmp')]
+
+    def test_written_on_close(self):
+        glider_nc = open_glider_netcdf(self.test_path, 'w', diskless=True).open()
+        glider_nc.write_profile({
+            'timestamp': np.arange(10, dtype=np.float64),
+            'm_depth-m': np.arange(10, dtype=np.float64)
+        })
+        glider_nc.set_segment_id(2)
+        self.assertFalse(os.path.exists(self.test_path))
+
+        glider_nc.close()
+        self.assertEqual(self.leftovers(), [])
+        with nc4.Dataset(self.test_path) as nc:
+            np.testing.assert_array_equal(nc.variables['depth'][:], range(10))
+            self.assertEqual(nc.variables['segment_id'].getValue(), 2)
+
+    def test_discarded_on_error(self):
+        def fail():
+            with open_glider_netcdf(self.test_path, 'w', diskless=True) as glider_nc:
+                glider_nc.set_segment_id(2)
+                raise RuntimeError('Failed while writing')
+
+        self.assertRaises(RuntimeError, fail)
+        self.assertFalse(os.path.exists(self.test_path))
+        self.assertEqual(self.leftovers(), [])
+
+    def test_new_files_only(self):
+        self.assertRaises(
+            ValueError,
+            open_glider_netcdf, self.test_path, 'a', diskless=True
+        )
+
+
+class TestUVBackfill(unittest.TestCase):
+
+    def setUp(self):
+        self.paths = [output('uv_{}.nc'.format(i)) for i in range(4)]
+        try:
+            os.makedirs(output())
+        except OSError:
+            pass  # Already exists
+
+    def tearDown(self):
+        for path in self.paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def profile(self, index, uv=False):
+        glider_nc = open_glider_netcdf(
+            self.paths[index], 'w', diskless=True
+        ).open()
+        columns = {
+            'timestamp': np.arange(3, dtype=np.float64) + 10 * index,
+            'm_depth-m': np.arange(3, dtype=np.float64)
+        }
+        if uv:
+            columns.update({
+                'm_present_time-timestamp': columns['timestamp'],
+                'm_water_vx-m/s': np.array([np.nan, 0.1, np.nan]),
+                'm_water_vy-m/s': np.array([np.nan, 0.2, np.nan]),
+                'm_gps_lat-lat': np.array([27.0, 27.5, 28.0]),
+                'm_gps_lon-lon': np.array([-83.0, -83.5, -84.0])
+            })
+        glider_nc.write_profile(columns)
+        return glider_nc
+
+    def test_backfill(self):
+        uv_backfill = UVBackfill()
+
+        pending = [self.profile(0), self.profile(1)]
+        for glider_nc in pending:
+            uv_backfill.update(glider_nc)
+            uv_backfill.close(glider_nc)
+        self.assertEqual(uv_backfill.pending, pending)
+        self.assertFalse(os.path.exists(self.paths[0]))
+
+        glider_nc = self.profile(2, uv=True)
+        uv_backfill.update(glider_nc)
+        # Pending profiles are filled and written, the current one stays open
+        self.assertEqual(uv_backfill.pending, [])
+        self.assertIsNotNone(glider_nc.nc)
+        uv_backfill.close(glider_nc)
+
+        glider_nc = self.profile(3)
+        uv_backfill.update(glider_nc)
+        uv_backfill.close(glider_nc)
+        uv_backfill.finish()
+
+        for path in self.paths:
+            with nc4.Dataset(path) as nc:
+                self.assertEqual(nc.variables['time_uv'].getValue(), 21.0)
+                self.assertAlmostEqual(nc.variables['u'].getValue(), 0.1)
+                self.assertAlmostEqual(nc.variables['lat_uv'].getValue(), 27.5)
+
+    def test_finish_without_uv(self):
+        uv_backfill = UVBackfill()
+        glider_nc = self.profile(0)
+        uv_backfill.update(glider_nc)
+        uv_backfill.close(glider_nc)
+        self.assertFalse(os.path.exists(self.paths[0]))
+
+        uv_backfill.finish()
+        with nc4.Dataset(self.paths[0]) as nc:
+            self.assertNotIn('time_uv', nc.variables)
+            np.testing.assert_array_equal(nc.variables['depth'][:], range(3))
+
+
+class TestStorageBenchmark(unittest.TestCase):
+
+    def test_benchmark(self):
+        args = argparse.Namespace(
+            flight=resource('usf-bass', 'usf-bass-2014-061-1-0.sbd'),
+            science=resource('usf-bass', 'usf-bass-2014-061-1-0.tbd'),
+            time='timestamp',
+            depth='m_depth-m',
+            gps_prefix='m_gps_',
+            segment_id=None,
+            mode='rt',
+            glider_config_path=resource('usf-bass'),
+            output_path=None
+        )
+        policies = OrderedDict([
+            ('default', {}),
+            ('uncompressed', {'zlib': False})
+        ])
+
+        results = benchmark(args, policies)
+        self.assertEqual([r[0] for r in results], ['default', 'uncompressed'])
+        for name, write, read, size in results:
+            self.assertGreater(write, 0)
+            self.assertGreaterEqual(read, 0)
+            self.assertGreater(size, 0)
+
 
 class TestMergedGliderDataReader(unittest.TestCase):
 
@@ -206,5 +511,239 @@ class TestMergedGliderDataReader(unittest.TestCase):
             glider_nc.update_bounds()
 
 
+class TestWriteProfile(unittest.TestCase):
+
+    def setUp(self):
+        self.stream_path = output('stream.nc')
+        self.bulk_path = output('bulk.nc')
+        try:
+            os.makedirs(output())
+        except OSError:
+            pass  # Already exists
+
+        self.columns = read_frame(
+            resource('usf-2016', 'usf-bass-2016-253-0-6.sbd'),
+            resource('usf-2016', 'usf-bass-2016-253-0-6.tbd')
+        )
+        interp_gps = get_file_set_gps(
+            None, None, 'timestamp', 'm_gps_', frame=self.columns
+        )
+        fill_gps_columns(self.columns, interp_gps, 'm_gps_')
+
+    def tearDown(self):
+        for path in (self.stream_path, self.bulk_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def test_matches_stream(self):
+        with open_glider_netcdf(self.stream_path, 'w') as glider_nc:
+            for line in columns_to_rows(self.columns):
+                glider_nc.stream_dict_insert(line)
+
+        with open_glider_netcdf(self.bulk_path, 'w') as glider_nc:
+            glider_nc.write_profile(self.columns)
+
+        with nc4.Dataset(self.stream_path) as stream_nc:
+            with nc4.Dataset(self.bulk_path) as bulk_nc:
+                self.assertEqual(
+                    sorted(stream_nc.variables),
+                    sorted(bulk_nc.variables)
+                )
+                self.assertIn('time_uv', bulk_nc.variables)
+                for name, variable in stream_nc.variables.items():
+                    np.testing.assert_array_equal(
+                        variable[:],
+                        bulk_nc.variables[name][:]
+                    )
+
+    def test_stream_plan(self):
+        with open_glider_netcdf(self.stream_path, 'w', buffer_rows=0) as glider_nc:
+            checked = []
+            check_datatype_exists = glider_nc.check_datatype_exists
+
+            def counting_check(key):
+                checked.append(key)
+                return check_datatype_exists(key)
+            glider_nc.check_datatype_exists = counting_check
+
+            for line in columns_to_rows(self.columns):
+                glider_nc.stream_dict_insert(line)
+
+            # Each reader key is resolved once per file
+            checked = [
+                key for key in checked
+                if key not in ('timestamp', 'time_uv', 'lat_uv', 'lon_uv')
+            ]
+            self.assertEqual(len(checked), len(set(checked)))
+            self.assertIn('m_depth-m', checked)
+
+    def test_buffered_stream(self):
+        with open_glider_netcdf(self.stream_path, 'w', buffer_rows=0) as glider_nc:
+            for line in columns_to_rows(self.columns):
+                glider_nc.stream_dict_insert(line)
+
+        with open_glider_netcdf(self.bulk_path, 'w', buffer_rows=100) as glider_nc:
+            for i, line in enumerate(columns_to_rows(self.columns)):
+                glider_nc.stream_dict_insert(line)
+                if i == 150:
+                    # Half a buffer has not been written yet
+                    self.assertEqual(len(glider_nc.nc.variables['time']), 100)
+
+        with nc4.Dataset(self.stream_path) as stream_nc:
+            with nc4.Dataset(self.bulk_path) as bulk_nc:
+                self.assertEqual(
+                    sorted(stream_nc.variables),
+                    sorted(bulk_nc.variables)
+                )
+                for name, variable in stream_nc.variables.items():
+                    np.testing.assert_array_equal(
+                        variable[:],
+                        bulk_nc.variables[name][:]
+                    )
+
+    def test_buffered_reads(self):
+        with open_glider_netcdf(self.stream_path, 'w') as glider_nc:
+            for i, line in enumerate(columns_to_rows(self.columns)):
+                glider_nc.stream_dict_insert(line)
+                if i == 10:
+                    break
+            self.assertEqual(len(glider_nc.nc.variables['time']), 0)
+            self.assertTrue(glider_nc.contains('m_depth-m'))
+            self.assertEqual(len(glider_nc.nc.variables['time']), 11)
+
+    def test_missing_timestamp(self):
+        columns = {'m_depth-m': np.array([1.0, 2.0])}
+        with open_glider_netcdf(self.bulk_path, 'w') as glider_nc:
+            self.assertRaises(ValueError, glider_nc.write_profile, columns)
+
+
+class TestQAQC(unittest.TestCase):
+
+    def setUp(self):
+        self.test_path = output('qaqc.nc')
+        try:
+            os.makedirs(output())
+        except OSError:
+            pass  # Already exists
+
+    def tearDown(self):
+        os.remove(self.test_path)
+
+    def test_vectorized_flags(self):
+        with open_glider_netcdf(self.test_path, 'w') as glider_nc:
+            glider_nc.add_qaqc_method(
+                'm_depth-m',
+                lambda values: np.where(
+                    values > 1000,
+                    GLIDER_QC['bad_data'],
+                    GLIDER_QC['good_data']
+                )
+            )
+            glider_nc.write_profile({
+                'timestamp': np.array([1.0, 2.0, 3.0, 4.0]),
+                'm_depth-m': np.array([10.0, np.nan, 2000.0, 5.0])
+            })
+            glider_nc.set_array(
+                'salinity-psu',
+                np.array([35.0, NC_FILL_VALUES['f8'], 36.0, np.nan])
+            )
+
+            depth_qc = glider_nc.nc.variables['depth_qc'][:]
+            self.assertEqual(
+                depth_qc.tolist(),
+                [
+                    GLIDER_QC['good_data'],
+                    None,
+                    GLIDER_QC['bad_data'],
+                    GLIDER_QC['good_data']
+                ]
+            )
+
+            salinity_qc = glider_nc.nc.variables['salinity_qc'][:]
+            self.assertEqual(
+                salinity_qc.tolist(),
+                [
+                    GLIDER_QC['no_qc_performed'],
+                    GLIDER_QC['missing_value'],
+                    GLIDER_QC['no_qc_performed'],
+                    GLIDER_QC['missing_value']
+                ]
+            )
+
+    def test_scalar_flag(self):
+        with open_glider_netcdf(self.test_path, 'w') as glider_nc:
+            self.assertEqual(
+                glider_nc.perform_qaqc('profile_time', 1.0),
+                GLIDER_QC['no_qc_performed']
+            )
+            self.assertEqual(
+                glider_nc.perform_qaqc('profile_time', NC_FILL_VALUES['f8']),
+                GLIDER_QC['missing_value']
+            )
+
+
+class TestDatatypesCache(unittest.TestCase):
+
+    def setUp(self):
+        self.config_path = tempfile.mkdtemp()
+        shutil.copy(
+            os.path.join(DEFAULT_GLIDER_BASE, 'datatypes.json'),
+            self.config_path
+        )
+        self.test_path = output('datatypes.nc')
+        try:
+            os.makedirs(output())
+        except OSError:
+            pass  # Already exists
+
+    def tearDown(self):
+        shutil.rmtree(self.config_path)
+        try:
+            os.remove(self.test_path)
+        except OSError:
+            pass
+
+    def test_shared_schema(self):
+        datatypes = load_datatypes(self.config_path)
+        self.assertIs(datatypes, load_datatypes(self.config_path))
+        self.assertRaises(TypeError, operator.setitem, datatypes, 'key', {})
+
+        with open_glider_netcdf(self.test_path, 'w', config_path=self.config_path) as glider_nc:
+            self.assertIs(glider_nc.datatypes, datatypes)
+            glider_nc.write_profile({
+                'timestamp': np.array([1.0, 2.0]),
+                'm_depth-m': np.array([1.0, 2.0])
+            })
+            self.assertIn(
+                'flag_meanings',
+                glider_nc.nc.variables['depth_qc'].ncattrs()
+            )
+
+        self.assertNotIn(
+            'flag_meanings',
+            datatypes['m_depth-m']['status_flag']['attrs']
+        )
+
+    def test_modified_schema(self):
+        datatypes = load_datatypes(self.config_path)
+
+        datatypes_path = os.path.join(self.config_path, 'datatypes.json')
+        stat = os.stat(datatypes_path)
+        os.utime(datatypes_path, (stat.st_atime, stat.st_mtime + 60))
+        self.assertIsNot(datatypes, load_datatypes(self.config_path))
+
+    def test_append_datatypes(self):
+        datatypes = load_datatypes(self.config_path)
+        with open_glider_netcdf(self.test_path, 'w', config_path=self.config_path) as glider_nc:
+            depth = dict(datatypes['m_depth-m'])
+            depth['name'] = 'extra_depth'
+            glider_nc.append_datatypes({'extra_depth-m': depth})
+            self.assertIn('extra_depth-m', glider_nc.datatypes)
+
+        self.assertNotIn('extra_depth-m', datatypes)
+
+
 if __name__ == '__main__':
     unittest.main()
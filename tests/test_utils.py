@@ -4,10 +4,19 @@ import os
 import unittest
 
 from gutils.yo import (
-    find_yo_extrema
+    find_yo_extrema,
+    ProfileIndex,
+    YoDetector
 )
 
 from gutils.yo.filters import (
+    default_filter,
+    apply_profile_filters,
+    depth_check,
+    number_of_points_check,
+    time_check,
+    distance_check,
+    filter_profiles,
     filter_profile_depth,
     filter_profile_time,
     filter_profile_distance,
@@ -146,6 +155,187 @@ class TestFindProfile(unittest.TestCase):
         #pp = pprint.PrettyPrinter(indent=4)
         #pp.pprint(filtered_profiled_dataset)
 
+    def test_default_filter_single_pass(self):
+        chained = filter_profile_depth(self.profiled_dataset)
+        chained = filter_profile_number_of_points(chained)
+        chained = filter_profile_time(chained)
+        chained = filter_profile_distance(chained)
+
+        np.testing.assert_array_equal(
+            default_filter(self.profiled_dataset),
+            chained
+        )
+        np.testing.assert_array_equal(
+            apply_profile_filters(self.profiled_dataset, [
+                depth_check(),
+                number_of_points_check(),
+                time_check(),
+                distance_check()
+            ]),
+            chained
+        )
+
+
+class TestFilterProfiles(unittest.TestCase):
+
+    def setUp(self):
+        # Profiles 1 and 3 are too shallow
+        depths = [2, 5, 2, 0.5, 0.4, 3, 6, 3, 0.2, 0.3]
+        profile_ids = [0, 0, 0, 1, 1, 2, 2, 2, 3, 3]
+        self.dataset = np.column_stack((
+            np.arange(len(depths), dtype=np.float64),
+            depths,
+            profile_ids
+        ))
+
+    def test_merged_into_next_profile(self):
+        filtered = filter_profile_depth(self.dataset)
+        # Failed profiles join the next good one, the trailing one is kept
+        np.testing.assert_array_equal(
+            filtered[:, 2],
+            [0, 0, 0, 1, 1, 1, 1, 1, 2, 2]
+        )
+        np.testing.assert_array_equal(filtered[:, :2], self.dataset[:, :2])
+
+    def test_conditional(self):
+        def conditional(profile):
+            return max(profile[:, 1]) >= 1
+
+        np.testing.assert_array_equal(
+            filter_profiles(self.dataset, conditional),
+            filter_profile_depth(self.dataset)
+        )
+
+    def test_no_profiles(self):
+        self.dataset[:, 2] = -1
+        filtered = filter_profile_depth(self.dataset)
+        np.testing.assert_array_equal(filtered[:, 2], 0)
+
+    def test_missing_profile(self):
+        self.dataset[self.dataset[:, 2] == 1, 2] = 0
+        self.assertRaises(IndexError, filter_profile_depth, self.dataset)
+
+
+class TestProfileIndex(unittest.TestCase):
+
+    def setUp(self):
+        depths = [2, 5, 8, 6, 4, 3, 5, 9]
+        profile_ids = [0, 0, 0, 1, 1, 1, 2, 2]
+        self.dataset = np.column_stack((
+            np.arange(len(depths), dtype=np.float64) * 10,
+            depths,
+            profile_ids
+        ))
+        self.profiles = ProfileIndex.from_dataset(self.dataset)
+
+    def test_records(self):
+        self.assertEqual(len(self.profiles), 3)
+        np.testing.assert_array_equal(self.profiles['start'], [0, 3, 6])
+        np.testing.assert_array_equal(self.profiles['end'], [3, 6, 8])
+        np.testing.assert_array_equal(self.profiles['t_start'], [0, 30, 60])
+        np.testing.assert_array_equal(self.profiles['t_end'], [20, 50, 70])
+        np.testing.assert_array_equal(self.profiles['depth_min'], [2, 3, 5])
+        np.testing.assert_array_equal(self.profiles['depth_max'], [8, 6, 9])
+        np.testing.assert_array_equal(self.profiles['direction'], [1, -1, 1])
+
+        profile = self.profiles[1]
+        self.assertEqual(profile['start'], 3)
+        self.assertEqual(profile['t_end'], 50)
+
+    def test_find(self):
+        np.testing.assert_array_equal(
+            self.profiles.find([-5, 0, 15, 25, 30, 70, 75]),
+            [-1, 0, 0, -1, 1, 2, -1]
+        )
+
+    def test_round_trip(self):
+        np.testing.assert_array_equal(self.profiles.to_dataset(), self.dataset)
+
+    def test_merge(self):
+        merged = self.profiles.merge([False, True, False])
+        np.testing.assert_array_equal(merged['start'], [0, 6])
+        np.testing.assert_array_equal(merged['end'], [6, 8])
+        np.testing.assert_array_equal(merged['depth_max'], [8, 9])
+        np.testing.assert_array_equal(
+            merged.to_dataset()[:, 2],
+            [0, 0, 0, 0, 0, 0, 1, 1]
+        )
+
+    def test_filters(self):
+        dataset = np.loadtxt(ctd_filepath, delimiter=',')
+        profiled_dataset = find_yo_extrema(dataset[:, 0], dataset[:, 3])
+
+        filtered = default_filter(ProfileIndex.from_dataset(profiled_dataset))
+        self.assertIsInstance(filtered, ProfileIndex)
+        np.testing.assert_array_equal(
+            filtered.to_dataset(),
+            default_filter(profiled_dataset)
+        )
+
+
+class TestYoDetector(unittest.TestCase):
+
+    def setUp(self):
+        dataset = np.loadtxt(ctd_filepath, delimiter=',')
+        self.timestamps = dataset[:, 0]
+        self.depths = dataset[:, 3]
+        self.batch = ProfileIndex.from_dataset(
+            find_yo_extrema(self.timestamps.copy(), self.depths.copy())
+        )
+
+    def detect(self, chunk_size):
+        detector = YoDetector()
+        found = []
+        for i in range(0, len(self.timestamps), chunk_size):
+            found.append(detector.update(
+                self.timestamps[i:i + chunk_size],
+                self.depths[i:i + chunk_size]
+            ))
+        found.append(detector.finish())
+        self.assertEqual(detector.rows, len(self.timestamps))
+        self.assertEqual(detector.profiles, sum(len(p) for p in found))
+        return found
+
+    def test_matches_find_yo_extrema(self):
+        for chunk_size in (1, 7, 100, len(self.timestamps)):
+            found = self.detect(chunk_size)
+
+            starts = []
+            ends = []
+            offset = 0
+            for profiles in found:
+                starts.extend(profiles['start'] + offset)
+                ends.extend(profiles['end'] + offset)
+                offset += len(profiles.timestamps)
+
+            np.testing.assert_array_equal(
+                np.concatenate([p.depths for p in found]),
+                self.batch.depths
+            )
+            # find_yo_extrema merges the rows after the last inflection into
+            # the last profile, the detector ends the series with them
+            np.testing.assert_array_equal(starts[:-1], self.batch['start'])
+            np.testing.assert_array_equal(ends[:-2], self.batch['end'][:-1])
+            self.assertEqual(ends[-1], len(self.timestamps))
+
+    def test_emitted_on_inflection(self):
+        detector = YoDetector()
+        # Profiles are returned by the chunk confirming their inflection
+        emitted = [
+            len(detector.update(self.timestamps[i:i + 20], self.depths[i:i + 20]))
+            for i in range(0, len(self.timestamps), 20)
+        ]
+        self.assertEqual(sum(emitted), len(self.batch) - 1)
+        self.assertEqual(emitted[-1], 0)
+        self.assertTrue(any(emitted[1:-1]))
+        self.assertEqual(len(detector.finish()), 2)
+
+    def test_no_depths(self):
+        detector = YoDetector()
+        profiles = detector.update([1, 2, 3], [float('nan'), 0, -1])
+        self.assertEqual(len(profiles), 0)
+        self.assertEqual(len(detector.finish()), 0)
+
 
 class TestInterpolateGPS(unittest.TestCase):
 